@@ -0,0 +1,162 @@
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+
+class AccessLog:
+    """Log estruturado (uma linha JSON por registro) com escrita em segundo plano.
+
+    Quem registra só monta um dict e o coloca numa fila limitada
+    (`max_queue`); uma thread tira os registros em lotes e escreve em `path`
+    (ou na saída padrão, se None). Fila cheia descarta o registro e soma em
+    `dropped` em vez de travar a requisição. Registros abaixo de `level` são
+    ignorados e os de acesso são amostrados com probabilidade `sample`.
+    O arquivo é rotacionado ao passar de `max_bytes` (arquivo.1 … arquivo.N,
+    com N = `backups`).
+    """
+
+    def __init__(self, path=None, level='info', sample=1.0, max_queue=10000,
+                 max_bytes=10 * 2**20, backups=3, batch=512):
+        self.path = path
+        self.level = LEVELS[level]
+        self.sample = sample
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch = batch
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.file = None
+        self.size = 0
+        self.drop_lock = threading.Lock()  # só no caminho de descarte
+        self.dropped = 0
+        self.written = 0
+        self.rotations = 0
+        self.writer = threading.Thread(target=self._run, daemon=True, name='access-log')
+        self.writer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, prefix):
+        """Configuração por variáveis `<prefix>_LOG_*` (FILE, LEVEL, SAMPLE,
+        QUEUE, MAX_BYTES, BACKUPS)."""
+        env = lambda name, default: os.getenv(f'{prefix}_LOG_{name}', default)
+        return cls(path=env('FILE', None) or None,
+                   level=env('LEVEL', 'info').lower(),
+                   sample=float(env('SAMPLE', 1.0)),
+                   max_queue=int(env('QUEUE', 10000)),
+                   max_bytes=int(env('MAX_BYTES', 10 * 2**20)),
+                   backups=int(env('BACKUPS', 3)))
+
+    def set_level(self, level):
+        self.level = LEVELS[level]
+
+    # --- Registro (caminho da requisição) --- #
+    def _emit(self, level, event, fields):
+        if LEVELS[level] < self.level:
+            return
+        record = {'ts': round(time.time(), 6), 'level': level, 'event': event, **fields}
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.drop_lock:
+                self.dropped += 1
+
+    def access(self, **fields):
+        """Uma requisição atendida (nível info, sujeita à amostragem)."""
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return
+        self._emit('info', 'access', fields)
+
+    def debug(self, event, **fields):
+        self._emit('debug', event, fields)
+
+    def info(self, event, **fields):
+        self._emit('info', event, fields)
+
+    def warning(self, event, **fields):
+        self._emit('warning', event, fields)
+
+    def error(self, event, **fields):
+        self._emit('error', event, fields)
+
+    # --- Escrita (thread de fundo) --- #
+    def _open(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def _write(self, records):
+        text = ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+        if self.path is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            if self.file is None:
+                self._open()
+            self.file.write(text)
+            self.file.flush()
+            self.size += len(text.encode('utf-8'))
+            if self.size >= self.max_bytes:
+                self._rotate()
+        self.written += len(records)
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in records
+            records = [r for r in records if r is not None]
+            try:
+                if records:
+                    self._write(records)
+            except (OSError, ValueError) as e:
+                # Sem onde escrever: conta como descarte e segue
+                with self.drop_lock:
+                    self.dropped += len(records)
+                print(f"[LOG] falha ao escrever o log: {e}", file=sys.stderr)
+            if stop:
+                return
+
+    def close(self, timeout=2.0):
+        """Escreve o que estiver na fila e encerra a thread (chamado no atexit)."""
+        if not self.writer.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.writer.join(timeout)
+        if self.file is not None:
+            self.file.close()
+
+    def stats(self):
+        return {
+            'level': next(name for name, n in LEVELS.items() if n == self.level),
+            'sample': self.sample,
+            'queued': self.queue.qsize(),
+            'max_queue': self.queue.maxsize,
+            'written': self.written,
+            'dropped': self.dropped,
+            'rotations': self.rotations,
+        }
@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class Overloaded(Exception):
+    """Sem vaga em nenhum backend e sem lugar (ou tempo) na fila de admissão."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, candidates):
+        self.candidates = set(candidates)
+        self.server_id = None  # preenchido por quem repassa a vaga
+        self.granted = threading.Event()
+
+
+class AdmissionControl:
+    """Limite de requisições simultâneas por backend + fila de admissão global.
+
+    Cada backend aceita até `max_inflight` requisições ao mesmo tempo. Quando
+    nenhum dos candidatos tem vaga, a requisição entra na fila da sua classe
+    (no máximo `max_queue` esperando no total) por até `queue_timeout_s`; fila
+    cheia ou tempo esgotado levantam Overloaded na hora, para o LB responder
+    503 em vez de empilhar threads.
+
+    Cada vaga liberada vai direto para alguém da fila, escolhido por deficit
+    round robin entre as classes: a cada volta a classe ganha `shares[classe]`
+    créditos e cada admissão gasta um. Com shares {'interactive': 4,
+    'bulk': 1}, sob disputa, quatro pedidos interativos entram para cada lote.
+    """
+
+    def __init__(self, max_inflight=32, max_queue=256, queue_timeout_s=1.0, shares=None):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.shares = dict(shares or {'default': 1})
+        if not self.shares or min(self.shares.values()) <= 0:
+            raise ValueError('shares deve ter ao menos uma classe, todas com peso > 0')
+        self.classes = list(self.shares)
+        self.lock = threading.Lock()
+        self.inflight = {}  # id do servidor -> requisições em andamento
+        self.queues = {c: deque() for c in self.classes}
+        self.deficit = {c: 0.0 for c in self.classes}
+        self.turn = 0
+        self.waiting = 0
+
+        self.admitted = {c: 0 for c in self.classes}
+        self.queued = {c: 0 for c in self.classes}
+        self.queue_ms_total = {c: 0.0 for c in self.classes}
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.queue_timeout_s))
+
+    def acquire(self, candidates, cls, deadline=None):
+        """Reserva uma vaga no primeiro servidor de `candidates` (ids, em ordem
+        de preferência) que tiver, ou espera na fila da classe `cls` até alguma
+        abrir (até `queue_timeout_s` ou `deadline`, em time.monotonic()).
+        Devolve o id do servidor; a vaga volta com `release`."""
+        start = time.monotonic()
+        with self.lock:
+            for server_id in candidates:
+                if self.inflight.get(server_id, 0) < self.max_inflight:
+                    self.inflight[server_id] = self.inflight.get(server_id, 0) + 1
+                    self.admitted[cls] += 1
+                    return server_id
+            if self.waiting >= self.max_queue:
+                self.shed_queue_full += 1
+                raise Overloaded('fila de admissão cheia', self.retry_after)
+            ticket = _Ticket(candidates)
+            self.queues[cls].append(ticket)
+            self.waiting += 1
+            self.queued[cls] += 1
+
+        limit = start + self.queue_timeout_s
+        if deadline is not None:
+            limit = min(limit, deadline)
+        ticket.granted.wait(max(limit - time.monotonic(), 0))
+
+        with self.lock:
+            self.queue_ms_total[cls] += (time.monotonic() - start) * 1000
+            if ticket.server_id is None:  # ninguém repassou vaga a tempo
+                self.queues[cls].remove(ticket)
+                self.waiting -= 1
+                self.shed_timeout += 1
+                raise Overloaded('tempo de espera na fila esgotado', self.retry_after)
+            self.admitted[cls] += 1
+            return ticket.server_id
+
+    def release(self, server_id):
+        with self.lock:
+            ticket = self._next_waiter(server_id)
+            if ticket is None:
+                self.inflight[server_id] -= 1
+                return
+            # A vaga passa direto para quem esperava: inflight não muda
+            self.waiting -= 1
+            ticket.server_id = server_id
+            ticket.granted.set()
+
+    def _next_waiter(self, server_id):
+        """Deficit round robin entre as classes com alguém que aceite `server_id`."""
+        eligible = {c: next((t for t in self.queues[c] if server_id in t.candidates), None)
+                    for c in self.classes}
+        if not any(eligible.values()):
+            return None
+        while True:
+            cls = self.classes[self.turn]
+            ticket = eligible[cls]
+            if ticket is not None and self.deficit[cls] >= 1:
+                self.deficit[cls] -= 1
+                self.queues[cls].remove(ticket)
+                return ticket
+            if not self.queues[cls]:
+                self.deficit[cls] = 0.0  # classe sem fila não acumula crédito
+            self.turn = (self.turn + 1) % len(self.classes)
+            nxt = self.classes[self.turn]
+            self.deficit[nxt] = min(self.deficit[nxt] + self.shares[nxt], self.shares[nxt] + 1)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_inflight': self.max_inflight,
+                'inflight': dict(self.inflight),
+                'queue_length': self.waiting,
+                'max_queue': self.max_queue,
+                'shares': self.shares,
+                'classes': {
+                    c: {
+                        'waiting': len(self.queues[c]),
+                        'admitted': self.admitted[c],
+                        'queued': self.queued[c],
+                        'avg_queue_ms': round(self.queue_ms_total[c] / self.queued[c], 2) if self.queued[c] else 0,
+                    } for c in self.classes
+                },
+                'queued': sum(self.queued.values()),
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+                'shed': self.shed_queue_full + self.shed_timeout,
+            }
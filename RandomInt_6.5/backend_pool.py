@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Conexões keep-alive mantidas por backend
+POOL_SIZE = int(os.getenv('LB_POOL_SIZE', 32))
+# Sessões sem uso há mais que isso (s) são descartadas
+POOL_IDLE_TIMEOUT = float(os.getenv('LB_POOL_IDLE_TIMEOUT', 60))
+
+_sessions = {}  # url do backend -> {'session': Session, 'last_used': monotonic}
+# Health checks usam uma sessão à parte (uma conexão por backend): se usassem
+# a de dados, o check periódico manteria a sessão sempre "em uso" e evict_idle
+# nunca a descartaria
+_health_sessions = {}  # url do backend -> Session
+_lock = threading.Lock()
+
+
+def _new_session(pool_maxsize=POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def session_for(server):
+    """Sessão HTTP reaproveitada (keep-alive) para o backend `server`."""
+    with _lock:
+        entry = _sessions.get(server['url'])
+        if entry is None:
+            entry = _sessions[server['url']] = {'session': _new_session(), 'last_used': 0.0}
+        entry['last_used'] = time.monotonic()
+        return entry['session']
+
+
+def get(server, path, **kwargs):
+    """GET em `server['url'] + path` usando a sessão do backend."""
+    return session_for(server).get(server['url'] + path, **kwargs)
+
+
+def health_get(server, path, **kwargs):
+    """GET de health check, fora da sessão de dados (não conta como uso)."""
+    with _lock:
+        session = _health_sessions.get(server['url'])
+        if session is None:
+            session = _health_sessions[server['url']] = _new_session(pool_maxsize=1)
+    return session.get(server['url'] + path, **kwargs)
+
+
+def discard(server):
+    """Fecha as conexões ociosas de um backend (ex.: servidor parado)."""
+    with _lock:
+        entry = _sessions.pop(server['url'], None)
+        health_session = _health_sessions.pop(server['url'], None)
+    if entry:
+        # Só fecha conexões paradas no pool; respostas em andamento continuam
+        entry['session'].close()
+    if health_session:
+        health_session.close()
+
+
+def evict_idle():
+    now = time.monotonic()
+    with _lock:
+        idle = [url for url, e in _sessions.items() if now - e['last_used'] > POOL_IDLE_TIMEOUT]
+        evicted = [_sessions.pop(url) for url in idle]
+    for entry in evicted:
+        entry['session'].close()
+    return len(evicted)
+
+
+def _janitor():
+    while True:
+        time.sleep(max(POOL_IDLE_TIMEOUT / 2, 1))
+        evict_idle()
+
+
+def start_janitor():
+    threading.Thread(target=_janitor, daemon=True).start()
+
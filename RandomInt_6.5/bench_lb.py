@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+# Teste de carga do Load Balancer: C clientes simultâneos, cada um com a sua
+# conexão, repetindo GET /generate pelo tempo pedido. Para cada nível de
+# concorrência mostra vazão, latência (p50/p99) e quantas requisições
+# falharam ou estouraram o timeout. Só usa a biblioteca padrão, então serve
+# igual para as duas versões do LB; rode uma vez com cada uma e compare até
+# que concorrência os erros continuam em zero e a latência não dispara:
+#
+#   LB_MODE=sync  python start_all.py   →  python bench_lb.py --clients 50 200 1000
+#   LB_MODE=async python start_all.py   →  python bench_lb.py --clients 50 200 1000
+#
+# Lembre de subir o limite de arquivos abertos (ulimit -n) para milhares de conexões.
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def request_once(host, port, path, timeout):
+    """Um GET numa conexão nova; devolve o status HTTP."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)  # corpo até o servidor fechar
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(host, port, path, stop_at, timeout, result):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            status = await request_once(host, port, path, timeout)
+        except asyncio.TimeoutError:
+            result['timeouts'] += 1
+            continue
+        except (OSError, ValueError, IndexError):
+            result['errors'] += 1
+            await asyncio.sleep(0.05)  # conexão recusada: não girar em falso
+            continue
+        if status == 200:
+            result['latencies'].append((time.perf_counter() - start) * 1000)
+        else:
+            result['errors'] += 1
+
+
+async def run_level(url, clients, duration, timeout):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    result = {'latencies': [], 'errors': 0, 'timeouts': 0}
+    stop_at = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, path, stop_at, timeout, result)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(result['latencies'])
+    return {
+        'ok': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+        'errors': result['errors'],
+        'timeouts': result['timeouts'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Conexões simultâneas no Load Balancer (sync x async)')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/generate')
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--duration', type=float, default=10, help='segundos por nível')
+    parser.add_argument('--timeout', type=float, default=5, help='timeout por requisição (s)')
+    args = parser.parse_args()
+
+    print(f"{'clientes':>8} {'ok':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'erros':>7} {'timeouts':>9}")
+    for clients in args.clients:
+        r = asyncio.run(run_level(args.url, clients, args.duration, args.timeout))
+        print(f"{clients:>8} {r['ok']:>8} {r['rps']:>9,.0f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+              f" {r['errors']:>7} {r['timeouts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import threading
+import time
+
+import metrics
+
+# Microbenchmark dos contadores de estatísticas: lock global (como era o
+# stats_lock) x contador fatiado por thread (metrics.Counter / ShardedLog).
+# Cada thread simula o caminho quente de /generate: conta a requisição do
+# servidor e anexa uma linha ao log. Cada implementação roda três vezes:
+#   - vazão (ops/s), sem instrumentação nenhuma;
+#   - latência por operação (p50/p99/máx em µs), cronometrando cada record;
+#   - espera por lock (quantas vezes e quanto tempo), com os locks trocados
+#     por TimedLock.
+# Os resultados variam bastante entre máquinas e rodadas (o GIL decide quem
+# roda), então compare as duas linhas da mesma rodada e repita algumas vezes.
+#
+#   python bench_stats.py --threads 32 64 --ops 20000
+
+SERVER_IDS = ('Server1', 'Server2', 'Server3')
+
+
+class GlobalLockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {sid: 0 for sid in SERVER_IDS}
+        self.log = []
+
+    def record(self, server_id, text):
+        with self.lock:
+            self.stats[server_id] += 1
+            self.log.append(text)
+            if len(self.log) > 1000:
+                self.log.pop(0)
+
+    def total(self):
+        with self.lock:
+            return sum(self.stats.values())
+
+
+class ShardedStats:
+    def __init__(self):
+        registry = metrics.Registry()  # fora do registro global de /metrics
+        self.counter = metrics.Counter('bench_requests_total', 'bench', ['server'], registry=registry)
+        self.log = metrics.ShardedLog(maxlen=max(1000 // metrics.SHARDS, 1))  # ~1000 no total, como o global
+
+    def record(self, server_id, text):
+        self.counter.inc(server_id)
+        self.log.append(text)
+
+    def total(self):
+        return sum(self.counter.collect().values())
+
+
+class TimedLock:
+    """Lock que soma o tempo de espera no acquire (para medir contenção)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waited = 0.0
+        self.contended = 0
+
+    def __enter__(self):
+        if not self.lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self.lock.acquire()
+            self.waited += time.perf_counter() - start
+            self.contended += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def instrument(impl):
+    """Troca os locks da implementação por TimedLock; devolve a lista deles."""
+    locks = []
+    if isinstance(impl, GlobalLockStats):
+        impl.lock = TimedLock()
+        locks.append(impl.lock)
+    else:
+        for container in (impl.counter.shards, impl.log.shards):
+            for i, (values, _) in enumerate(container):
+                lock = TimedLock()
+                container[i] = (values, lock)
+                locks.append(lock)
+    return locks
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(impl, threads, ops, timed=False, latency=False):
+    locks = instrument(impl) if timed else []
+    barrier = threading.Barrier(threads + 1)
+    durations = [[] for _ in range(threads)]
+
+    def worker(n):
+        server_id = SERVER_IDS[n % len(SERVER_IDS)]
+        barrier.wait()
+        if not latency:
+            for i in range(ops):
+                impl.record(server_id, f"{i} ← {server_id}")
+            return
+        out, clock = durations[n], time.perf_counter
+        for i in range(ops):
+            text = f"{i} ← {server_id}"
+            start = clock()
+            impl.record(server_id, text)
+            out.append(clock() - start)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    assert impl.total() == threads * ops
+    result = {
+        'ops_s': threads * ops / elapsed,
+        'contended': sum(lock.contended for lock in locks),
+        'wait_ms': sum(lock.waited for lock in locks) * 1000,
+    }
+    if latency:
+        all_us = sorted(d * 1e6 for per_thread in durations for d in per_thread)
+        result.update(p50_us=percentile(all_us, 0.50), p99_us=percentile(all_us, 0.99), max_us=all_us[-1])
+    return result
+
+
+def measure(factory, threads, ops):
+    # Vazão sem instrumentação (o TimedLock custa mais que o próprio lock e
+    # o fatiado tem dois por operação); latência e espera em rodadas à parte
+    result = run(factory(), threads, ops)
+    lat = run(factory(), threads, ops, latency=True)
+    timed = run(factory(), threads, ops, timed=True)
+    result.update(p50_us=lat['p50_us'], p99_us=lat['p99_us'], max_us=lat['max_us'],
+                  contended=timed['contended'], wait_ms=timed['wait_ms'])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Contenção de stats_lock x contadores fatiados')
+    parser.add_argument('--threads', type=int, nargs='+', default=[32, 64])
+    parser.add_argument('--ops', type=int, default=20000, help='operações por thread')
+    args = parser.parse_args()
+
+    print(f"{'threads':>7} {'implementação':<14} {'ops/s':>12} {'p50 µs':>8} {'p99 µs':>8} {'máx µs':>10}"
+          f" {'esperas':>9} {'espera total':>13}")
+    for threads in args.threads:
+        for name, factory in (('lock global', GlobalLockStats), ('fatiado', ShardedStats)):
+            r = measure(factory, threads, args.ops)
+            print(f"{threads:>7} {name:<14} {r['ops_s']:>12,.0f} {r['p50_us']:>8.1f} {r['p99_us']:>8.1f}"
+                  f" {r['max_us']:>10.0f} {r['contended']:>9} {r['wait_ms']:>10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitBreaker:
+    """Disjuntor por backend: fechado → aberto → meio-aberto → fechado.
+
+    Fechado: registra sucesso/erro/latência numa janela deslizante de
+    `window_s` segundos. Com pelo menos `min_requests` amostras, abre se a
+    taxa de erros passar de `error_rate` ou a de chamadas lentas (acima de
+    `slow_ms`) passar de `slow_rate`.
+    Aberto: recusa tudo por `open_s` segundos.
+    Meio-aberto: deixa passar só `probes` requisições de teste; se todas
+    derem certo fecha, se alguma falhar volta a abrir.
+
+    `on_change(estado)` é chamado (fora do lock) a cada transição.
+    """
+
+    def __init__(self, on_change=None, window_s=10.0, min_requests=5, error_rate=0.5,
+                 slow_ms=1000.0, slow_rate=0.8, open_s=5.0, probes=3):
+        self.on_change = on_change
+        self.window_s = window_s
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        self.probes = probes
+
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.samples = deque()  # (instante, ok, lento)
+        self.opened_at = 0.0
+        self.probes_started = 0
+        self.probes_ok = 0
+        self.trips = 0
+
+    def _set_state(self, state):
+        """Troca o estado (com o lock); devolve o novo estado se mudou."""
+        if state == self.state:
+            return None
+        self.state = state
+        self.samples.clear()
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+        elif state == HALF_OPEN:
+            self.probes_started = self.probes_ok = 0
+        return state
+
+    def _notify(self, changed):
+        if changed and self.on_change:
+            self.on_change(changed)
+
+    def poll(self):
+        """Aplica a transição por tempo (aberto → meio-aberto) e devolve o estado."""
+        with self.lock:
+            changed = None
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_s:
+                changed = self._set_state(HALF_OPEN)
+            state = self.state
+        self._notify(changed)
+        return state
+
+    def allow(self):
+        """True se a requisição pode ser enviada a este backend agora."""
+        state = self.poll()
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        with self.lock:
+            if self.probes_started < self.probes:
+                self.probes_started += 1
+                return True
+            return False
+
+    def record(self, ok, latency_ms=None):
+        now = time.monotonic()
+        slow = latency_ms is not None and latency_ms > self.slow_ms
+        with self.lock:
+            changed = None
+            if self.state == HALF_OPEN:
+                if not ok or slow:
+                    changed = self._set_state(OPEN)
+                else:
+                    self.probes_ok += 1
+                    if self.probes_ok >= self.probes:
+                        changed = self._set_state(CLOSED)
+            elif self.state == CLOSED:
+                self.samples.append((now, ok, slow))
+                while self.samples and now - self.samples[0][0] > self.window_s:
+                    self.samples.popleft()
+                n = len(self.samples)
+                if n >= self.min_requests:
+                    errors = sum(1 for _, good, _ in self.samples if not good)
+                    slows = sum(1 for _, _, is_slow in self.samples if is_slow)
+                    if errors / n >= self.error_rate or slows / n >= self.slow_rate:
+                        changed = self._set_state(OPEN)
+        self._notify(changed)
+
+    def reset(self):
+        with self.lock:
+            changed = self._set_state(CLOSED)
+        self._notify(changed)
+
+    def trip(self):
+        """Abre o disjuntor na hora (ex.: health check falhou)."""
+        with self.lock:
+            changed = self._set_state(OPEN)
+            if not changed:
+                self.opened_at = time.monotonic()
+        self._notify(changed)
+
+    def stats(self):
+        with self.lock:
+            n = len(self.samples)
+            errors = sum(1 for _, good, _ in self.samples if not good)
+            return {
+                'state': self.state,
+                'window_requests': n,
+                'window_error_rate': round(errors / n, 3) if n else 0,
+                'trips': self.trips,
+            }
@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class _Batch:
+    def __init__(self):
+        self.size = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.dispatched = None
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """Agrupa requisições concorrentes com a mesma chave numa só chamada.
+
+    A primeira requisição de uma chave vira "líder": espera até `window_ms`
+    (ou até juntar `max_batch` pedidos), chama `fetch(key, n)` uma única vez
+    e distribui o resultado — `fetch` deve devolver (servidor, lista com n
+    itens). As demais só aguardam a sua posição na lista.
+    """
+
+    def __init__(self, fetch, window_ms=1.0, max_batch=64):
+        self.fetch = fetch
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.open = {}  # chave -> lote ainda aceitando pedidos
+
+        # Métricas para ajustar a janela
+        self.requests = 0
+        self.backend_calls = 0
+        self.queue_ms_total = 0.0
+
+    def submit(self, key):
+        arrived = time.perf_counter()
+        with self.lock:
+            batch = self.open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self.open[key] = _Batch()
+            index = batch.size
+            batch.size += 1
+            if batch.size >= self.max_batch:
+                del self.open[key]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window_ms / 1000)
+            with self.lock:
+                if self.open.get(key) is batch:
+                    del self.open[key]
+                count = batch.size
+            batch.dispatched = time.perf_counter()
+            try:
+                batch.result = self.fetch(key, count)
+            except Exception as e:
+                batch.error = e
+            batch.done.set()
+        else:
+            batch.done.wait()
+
+        with self.lock:
+            self.requests += 1
+            self.backend_calls += leader
+            self.queue_ms_total += (batch.dispatched - arrived) * 1000
+
+        if batch.error is not None:
+            raise batch.error
+        server, items = batch.result
+        return server, items[index], batch.size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'window_ms': self.window_ms,
+                'max_batch': self.max_batch,
+                'requests': self.requests,
+                'backend_calls': self.backend_calls,
+                'coalescing_ratio': round(self.requests / self.backend_calls, 2) if self.backend_calls else 0,
+                'avg_queue_ms': round(self.queue_ms_total / self.requests, 3) if self.requests else 0,
+            }
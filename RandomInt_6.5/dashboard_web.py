@@ -1,14 +1,19 @@
-from flask import Flask, jsonify, request, render_template
-import requests
+from flask import Flask, Response, g, jsonify, request, render_template
+import backend_pool
 import subprocess
 import os
 import time
 import threading
 import random
-from concurrent.futures import ThreadPoolExecutor
+from health_scheduler import HealthScheduler
+import metrics
+import access_log
 
 app = Flask(__name__)
 
+# Log JSON-lines em segundo plano (DASHBOARD_LOG_FILE, DASHBOARD_LOG_LEVEL, ...)
+log = access_log.AccessLog.from_env('DASHBOARD')
+
 # --- CONFIG SERVIDORES ---
 SERVERS = [
     {'id': 'Server1', 'url': 'http://127.0.0.1:5001', 'weight': 60, 'healthy': True, 'port': 5001},
@@ -17,11 +22,56 @@ SERVERS = [
 ]
 
 processes = {}
-executor = ThreadPoolExecutor()
-stats = {'Server1': 0, 'Server2': 0, 'Server3': 0}
-stats_lock = threading.Lock()
 failure_simulations = {}
-generation_log = []  # Log de números gerados
+
+# Slow-start, como no load_balancer.py: servidor que volta (start, restart_all,
+# fim de simulate_failure ou health check) começa com uma fração do peso e chega
+# ao peso cheio em DASHBOARD_SLOW_START_S segundos (0 desliga)
+SLOW_START_S = float(os.getenv('DASHBOARD_SLOW_START_S', 10))
+SLOW_START_MODE = os.getenv('DASHBOARD_SLOW_START_MODE', 'linear')
+SLOW_START_MIN = 0.05
+
+
+def mark_recovered(server):
+    if SLOW_START_S > 0:
+        server['recovered_at'] = time.monotonic()
+
+
+def current_weight(server):
+    recovered_at = server.get('recovered_at')
+    if recovered_at is None:
+        return server['weight']
+    progress = (time.monotonic() - recovered_at) / SLOW_START_S
+    if progress >= 1:
+        server['recovered_at'] = None
+        return server['weight']
+    if SLOW_START_MODE == 'exponential':
+        factor = SLOW_START_MIN * (1 / SLOW_START_MIN) ** progress
+    else:
+        factor = SLOW_START_MIN + (1 - SLOW_START_MIN) * progress
+    return server['weight'] * factor
+
+# --- MÉTRICAS (/metrics) ---
+REQUESTS = metrics.Counter('randint_dashboard_requests_total', 'Requisições atendidas por rota e status.',
+                           ['route', 'status'])
+UPSTREAM_REQUESTS = metrics.Counter('randint_dashboard_upstream_requests_total',
+                                    'Chamadas aos servidores por resultado (ok/error).', ['server', 'outcome'])
+UPSTREAM_LATENCY = metrics.Histogram('randint_dashboard_upstream_latency_seconds',
+                                     'Latência das chamadas bem-sucedidas aos servidores.', ['server'])
+HEALTH_TRANSITIONS = metrics.Counter('randint_dashboard_health_transitions_total',
+                                     'Mudanças de saúde dos servidores.', ['server', 'to'])
+INFLIGHT = metrics.Gauge('randint_dashboard_inflight', 'Requisições /generate em andamento.')
+metrics.Callback('randint_dashboard_server_healthy', 'Servidor no pool (1) ou fora (0).', labels=['server'],
+                 fn=lambda: {(s['id'],): int(s['healthy']) for s in SERVERS})
+metrics.Callback('randint_dashboard_log_dropped_total', 'Registros de log descartados com a fila cheia.',
+                 'counter', fn=lambda: log.stats()['dropped'])
+metrics.register_process_metrics()
+
+# Contagem por servidor e log de números gerados ficam em fatias por thread:
+# /generate não disputa lock nenhum, /api/status soma e intercala na leitura
+served = metrics.Counter('randint_dashboard_backend_requests_total', 'Requisições atendidas por servidor.',
+                         ['server'])
+generation_log = metrics.ShardedLog(maxlen=max(200 // metrics.SHARDS, 1))  # maxlen vale por fatia
 
 
 # --- CONTROLE DE PROCESSOS ---
@@ -36,6 +86,7 @@ def start_server(server_id):
     proc = subprocess.Popen(["python", "server.py"], env=env, cwd=os.getcwd())
     processes[server_id] = proc
     server['healthy'] = True
+    mark_recovered(server)
     return True, f"{server_id} iniciado"
 
 
@@ -51,26 +102,30 @@ def stop_server(server_id):
     del processes[server_id]
     server = next(s for s in SERVERS if s['id'] == server_id)
     server['healthy'] = False
+    backend_pool.discard(server)
     return True, f"{server_id} parado"
 
 
 # --- HEALTH CHECK ---
 def health_check(server):
+    was_healthy = server['healthy']
     try:
-        resp = requests.get(f"{server['url']}/health", timeout=1)
+        resp = backend_pool.health_get(server, '/health', timeout=1)
         server['healthy'] = resp.status_code == 200
     except:
         server['healthy'] = False
+    if server['healthy'] != was_healthy:
+        HEALTH_TRANSITIONS.inc(server['id'], 'up' if server['healthy'] else 'down')
+        if server['healthy']:
+            mark_recovered(server)
+    return server['healthy']
 
 
-def periodic_health():
-    while True:
-        time.sleep(5)
-        for s in SERVERS:
-            executor.submit(health_check, s)
-
-
-threading.Thread(target=periodic_health, daemon=True).start()
+# Intervalo curto para servidor fora do ar ou recém-recuperado, longo quando estável
+health = HealthScheduler(SERVERS, health_check,
+                         min_interval=float(os.getenv('DASHBOARD_HEALTH_MIN_S', 1)),
+                         max_interval=float(os.getenv('DASHBOARD_HEALTH_MAX_S', 10))).start()
+backend_pool.start_janitor()
 
 
 # --- SIMULAÇÃO DE FALHA ---
@@ -93,35 +148,54 @@ def simulate_failure(server_id, seconds=10):
 # --- ROTAS ---
 @app.route('/generate')
 def generate():
+    g.started = time.perf_counter()
     healthy = [s for s in SERVERS if s['healthy']]
     if not healthy:
         return jsonify({'error': 'Nenhum servidor ativo'}), 503
 
-    weights = [s['weight'] for s in healthy]
+    weights = [current_weight(s) for s in healthy]
     chosen = random.choices(healthy, weights=weights)[0]
     params = request.args.to_dict()
 
+    INFLIGHT.inc()
+    g.backend = chosen['id']
     try:
-        resp = requests.get(f"{chosen['url']}/generate", params=params, timeout=3)
+        headers = {'Accept': request.headers.get('Accept', 'application/json')}
+        start = time.perf_counter()
+        resp = backend_pool.get(chosen, '/generate', params=params, headers=headers, timeout=3)
         if resp.status_code != 200:
             raise Exception("Erro no servidor")
+        UPSTREAM_REQUESTS.inc(chosen['id'], 'ok')
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, chosen['id'])
+
+        # Formatos binários (octet-stream / npy) passam intactos
+        if not resp.headers.get('Content-Type', '').startswith('application/json'):
+            served.inc(chosen['id'])
+            generation_log.append(f"lote binário de {resp.headers.get('X-Count')} ← {chosen['id']}")
+            headers = {k: v for k, v in resp.headers.items() if k.startswith('X-')}
+            headers['X-Request-To'] = chosen['url']
+            return Response(resp.content, content_type=resp.headers.get('Content-Type'), headers=headers)
+
         data = resp.json()
         data['request_to'] = chosen['url']
 
-        with stats_lock:
-            stats[chosen['id']] += 1
-            entry = f"{len(generation_log) + 1}. {data['number']} ← {data['from_server']}"
-            generation_log.append(entry)
-            if len(generation_log) > 1000:  # Limite opcional
-                generation_log.pop(0)
+        served.inc(chosen['id'])
+        if 'numbers' in data:
+            generation_log.append(f"lote de {data['count']} ← {data['from_server']}")
+        else:
+            generation_log.append(f"{data['number']} ← {data['from_server']}")
 
         return jsonify(data)
     except Exception as e:
-        print(f"[ERRO] Falha em {chosen['id']}: {e}")
+        log.error('upstream_failure', server=chosen['id'], error=str(e))
+        UPSTREAM_REQUESTS.inc(chosen['id'], 'error')
+        if chosen['healthy']:
+            HEALTH_TRANSITIONS.inc(chosen['id'], 'down')
         chosen['healthy'] = False
-        entry = f"{len(generation_log) + 1}. [ERRO] {chosen['id']} offline"
-        generation_log.append(entry)
+        generation_log.append(f"[ERRO] {chosen['id']} offline")
         return jsonify({'error': f"{chosen['id']} offline"}), 500
+    finally:
+        INFLIGHT.dec()
 
 
 @app.route('/set_weight')
@@ -171,21 +245,37 @@ def sim_failure():
 
 @app.route('/api/status')
 def api_status():
-    with stats_lock:
-        return jsonify({
-            'servers': [
-                {
-                    'id': s['id'],
-                    'status': 'ON' if s['healthy'] else 'OFF',
-                    'weight': s['weight'],
-                    'requests': stats[s['id']],
-                    'running': s['id'] in processes and processes[s['id']].poll() is None,
-                    'failure_in': failure_simulations.get(s['id'], 0)
-                } for s in SERVERS
-            ],
-            'total_requests': sum(stats.values()),
-            'generation_log': generation_log[-200:]  # últimos 20
-        })
+    counts = served.collect()
+    return jsonify({
+        'servers': [
+            {
+                'id': s['id'],
+                'status': 'ON' if s['healthy'] else 'OFF',
+                'weight': s['weight'],
+                'requests': counts.get((s['id'],), 0),
+                'running': s['id'] in processes and processes[s['id']].poll() is None,
+                'failure_in': failure_simulations.get(s['id'], 0)
+            } for s in SERVERS
+        ],
+        'total_requests': sum(counts.values()),
+        'health': health.stats(),
+        'log': log.stats(),
+        'generation_log': [f"{n}. {text}" for n, text in generation_log.recent(200)]
+    })
+
+@app.after_request
+def count_request(resp):
+    if request.endpoint != 'metrics_route':
+        REQUESTS.inc(request.endpoint or 'unknown', resp.status_code)
+    if request.endpoint == 'generate':
+        log.access(route='generate', status=resp.status_code,
+                   ms=round((time.perf_counter() - g.started) * 1000, 2),
+                   client=request.remote_addr, server=g.get('backend'))
+    return resp
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/')
 def dashboard():
@@ -193,8 +283,7 @@ def dashboard():
 
 @app.route('/api/clear_log', methods=['POST'])
 def clear_log():
-    global generation_log
-    generation_log = []
+    generation_log.clear()
     return jsonify({'message': 'Log limpo'}), 200
 
 if __name__ == '__main__':
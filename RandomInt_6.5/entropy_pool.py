@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from array import array
+from collections import deque
+
+try:
+    import numpy as np  # opcional: mapeamento vetorizado das palavras
+except ImportError:
+    np = None
+
+WORD_BITS = 32
+WORD_SPAN = 1 << WORD_BITS
+
+
+def _new_words(n):
+    """Gera `n` palavras de 32 bits de uma vez (sem um objeto Python por palavra)."""
+    words = array('I')
+    if words.itemsize != 4:  # plataformas exóticas
+        words = array('L')
+    words.frombytes(random.getrandbits(WORD_BITS * n).to_bytes(4 * n, 'little'))
+    return words
+
+
+class EntropyPool:
+    """Buffer circular de palavras aleatórias reabastecido em segundo plano.
+
+    O caminho da requisição só copia uma fatia do buffer e avança o ponteiro
+    de leitura; a geração das palavras fica por conta da thread de refill,
+    acordada sempre que o nível cai abaixo de `low_water`.
+    """
+
+    def __init__(self, size=1 << 20, low_water=0.5, block=1 << 16, rate_window_s=10):
+        self.size = size
+        self.low_water = int(size * low_water)
+        self.block = min(block, size)
+        self.words = _new_words(size)
+        self.read_pos = 0
+        self.available = size  # começa cheio
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        # Métricas para dimensionar o pool
+        self.refilled_words = 0
+        self.underflows = 0
+        # (instante, refilled_words) a cada volta da thread de refill (~1/s),
+        # para a taxa real de reabastecimento numa janela de `rate_window_s`
+        self.rate_window_s = rate_window_s
+        self.history = deque([(time.monotonic(), 0)])
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refill_loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def _refill_loop(self):
+        while True:
+            self.wakeup.wait(timeout=1)
+            self.wakeup.clear()
+            while self.available < self.size:
+                n = min(self.block, self.size - self.available)
+                fresh = _new_words(n)  # fora do lock
+                with self.lock:
+                    n = min(n, self.size - self.available)
+                    write_pos = (self.read_pos + self.available) % self.size
+                    first = min(n, self.size - write_pos)
+                    self.words[write_pos:write_pos + first] = fresh[:first]
+                    if n > first:
+                        self.words[:n - first] = fresh[first:n]
+                    self.available += n
+                    self.refilled_words += n
+            now = time.monotonic()
+            with self.lock:
+                self.history.append((now, self.refilled_words))
+                while now - self.history[0][0] > self.rate_window_s and len(self.history) > 2:
+                    self.history.popleft()
+
+    def take(self, n):
+        """Retira `n` palavras do buffer (gera na hora o que faltar)."""
+        with self.lock:
+            k = min(n, self.available)
+            end = self.read_pos + k
+            if end <= self.size:
+                out = self.words[self.read_pos:end]
+            else:
+                out = self.words[self.read_pos:] + self.words[:end - self.size]
+            self.read_pos = end % self.size
+            self.available -= k
+            low = self.available < self.low_water
+            if k < n:
+                self.underflows += 1
+        if low:
+            self.wakeup.set()
+        if k < n:
+            out += _new_words(n - k)
+        return out
+
+    def randints(self, min_val, max_val, count):
+        """`count` inteiros uniformes em [min_val, max_val] (rejeição sem viés).
+
+        Só vale para intervalos de até 2**32 valores; acima disso retorna None.
+        """
+        span = max_val - min_val + 1
+        if span > WORD_SPAN:
+            return None
+        # Palavras >= limit são descartadas para que `w % span` seja uniforme
+        limit = WORD_SPAN - WORD_SPAN % span
+        accept_ratio = limit / WORD_SPAN
+
+        if np is not None:
+            out = np.empty(0, dtype=np.int64)
+            while len(out) < count:
+                missing = count - len(out)
+                words = self.take(int(missing / accept_ratio) + 1)
+                words = np.frombuffer(words, dtype=np.uint32).astype(np.int64)
+                words = words[words < limit][:missing]
+                out = np.concatenate((out, words % span + min_val))
+            return out
+
+        out = array('q')
+        while len(out) < count:
+            missing = count - len(out)
+            words = self.take(int(missing / accept_ratio) + 1)
+            out.extend([min_val + w % span for w in words if w < limit][:missing])
+        return out
+
+    def refill_rate(self):
+        """Palavras reabastecidas por segundo na última janela (0 com o pool parado)."""
+        with self.lock:
+            since, words = self.history[0]
+            refilled = self.refilled_words
+        elapsed = time.monotonic() - since
+        return (refilled - words) / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'available': self.available,
+            'fill_level': round(self.available / self.size, 3),
+            'refilled_words': self.refilled_words,
+            'refill_rate_wps': round(self.refill_rate()),
+            'underflows': self.underflows,
+        }
@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HealthScheduler:
+    """Health checks com intervalo próprio por servidor.
+
+    Servidor fora do ar ou que acabou de mudar de estado é verificado a cada
+    `min_interval`; depois de `stable_after` resultados iguais seguidos o
+    intervalo dobra até `max_interval`. Cada agendamento tem um jitter de
+    ±`jitter` para os checks não saírem sincronizados, e um servidor com check
+    ainda em andamento não recebe outro (o pool tem uma thread por servidor).
+
+    `check(server)` faz a verificação, aplica o resultado e devolve True/False.
+    """
+
+    def __init__(self, servers, check, min_interval=1.0, max_interval=10.0,
+                 stable_after=3, jitter=0.2):
+        self.servers = servers
+        self.check = check
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stable_after = stable_after
+        self.jitter = jitter
+        self.executor = ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix='health')
+        self.lock = threading.Lock()
+        now = time.monotonic()
+        self.state = {
+            s['id']: {'interval': min_interval, 'next_due': now + self._jittered(min_interval),
+                      'pending': False, 'ok': None, 'streak': 0,
+                      'last_ok': now, 'last_fail': now}
+            for s in servers
+        }
+        self.detections = []   # segundos entre o último OK e a detecção da queda
+        self.recoveries = []   # segundos entre a última falha e a detecção da volta
+
+    def _jittered(self, interval):
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def _loop(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = [s for s in self.servers
+                       if not self.state[s['id']]['pending'] and self.state[s['id']]['next_due'] <= now]
+                for s in due:
+                    self.state[s['id']]['pending'] = True
+                waits = [st['next_due'] - now for st in self.state.values() if not st['pending']]
+            for s in due:
+                self.executor.submit(self._run, s)
+            time.sleep(min(max(min(waits, default=self.min_interval), 0.05), self.min_interval))
+
+    def _run(self, server):
+        try:
+            ok = bool(self.check(server))
+        except Exception:
+            ok = False
+        now = time.monotonic()
+        with self.lock:
+            st = self.state[server['id']]
+            if st['ok'] is not None and ok != st['ok']:
+                if ok:
+                    self.recoveries.append(now - st['last_fail'])
+                else:
+                    self.detections.append(now - st['last_ok'])
+                del self.recoveries[:-100], self.detections[:-100]
+                st['streak'] = 0
+            st['ok'] = ok
+            st['streak'] += 1
+            st['last_ok' if ok else 'last_fail'] = now
+            if not ok or st['streak'] < self.stable_after:
+                st['interval'] = self.min_interval
+            else:
+                st['interval'] = min(st['interval'] * 2, self.max_interval)
+            st['next_due'] = now + self._jittered(st['interval'])
+            st['pending'] = False
+
+    def stats(self):
+        def summary(values):
+            if not values:
+                return {'count': 0, 'avg_s': 0, 'max_s': 0}
+            return {'count': len(values), 'avg_s': round(sum(values) / len(values), 2),
+                    'max_s': round(max(values), 2)}
+
+        with self.lock:
+            return {
+                'intervals_s': {sid: round(st['interval'], 2) for sid, st in self.state.items()},
+                'detection': summary(self.detections),
+                'recovery': summary(self.recoveries),
+            }
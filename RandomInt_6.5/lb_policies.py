@@ -0,0 +1,136 @@
+import os
+import random
+import threading
+
+# Peso da amostra mais recente na média móvel (EWMA) de latência
+EWMA_ALPHA = float(os.getenv('LB_EWMA_ALPHA', 0.3))
+_load_lock = threading.Lock()
+
+
+def record_start(server):
+    """Marca uma requisição em andamento no servidor."""
+    with _load_lock:
+        server['inflight'] = server.get('inflight', 0) + 1
+
+
+def record_end(server, latency_ms=None):
+    """Fecha a requisição e atualiza a EWMA de latência (se houver amostra)."""
+    with _load_lock:
+        server['inflight'] = max(server.get('inflight', 1) - 1, 0)
+        if latency_ms is not None:
+            ewma = server.get('ewma_ms')
+            server['ewma_ms'] = latency_ms if not ewma else ewma + EWMA_ALPHA * (latency_ms - ewma)
+
+
+class AliasTable:
+    """Sorteio ponderado em O(1) pelo método de Vose (tabela de aliases).
+
+    A tabela é montada uma vez (O(n)) e cada sorteio usa apenas um índice
+    aleatório e uma comparação.
+    """
+
+    def __init__(self, servers, weights):
+        n = len(servers)
+        total = float(sum(weights))
+        self.servers = list(servers)
+        self.prob = [0.0] * n
+        self.alias = [0] * n
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        for i in small + large:  # sobras por arredondamento
+            self.prob[i] = 1.0
+
+    def pick(self):
+        i = random.randrange(len(self.servers))
+        if random.random() < self.prob[i]:
+            return self.servers[i]
+        return self.servers[self.alias[i]]
+
+
+class SmoothWRR:
+    """Round-robin ponderado suave (o mesmo algoritmo do nginx).
+
+    Determinístico: com pesos 60/30/10, a cada 10 requisições cada servidor
+    recebe exatamente 6/3/1, intercalados em vez de em rajadas.
+    """
+
+    def __init__(self, servers, weights):
+        self.servers = list(servers)
+        self.weights = list(weights)
+        self.total = sum(weights)
+        self.current = [0] * len(servers)
+        self.lock = threading.Lock()
+
+    def pick(self):
+        with self.lock:
+            best = 0
+            for i, w in enumerate(self.weights):
+                self.current[i] += w
+                if self.current[i] > self.current[best]:
+                    best = i
+            self.current[best] -= self.total
+            return self.servers[best]
+
+
+class PowerOfTwoChoices:
+    """Sorteia dois candidatos e fica com o menos carregado.
+
+    A carga é (requisições em andamento + 1) × EWMA da latência observada,
+    então um servidor lento ou congestionado perde a disputa mesmo tendo
+    peso alto. Com `weighted=True` os candidatos são sorteados pelos pesos.
+    """
+
+    def __init__(self, servers, weights, weighted=False):
+        self.servers = list(servers)
+        self.table = AliasTable(servers, weights) if weighted else None
+
+    def _candidate(self):
+        return self.table.pick() if self.table else random.choice(self.servers)
+
+    @staticmethod
+    def load(server):
+        return (server.get('inflight', 0) + 1) * max(server.get('ewma_ms') or 0.0, 1.0)
+
+    def pick(self):
+        a = self._candidate()
+        if len(self.servers) == 1:
+            return a
+        b = self._candidate()
+        for _ in range(3):  # evita comparar o servidor com ele mesmo
+            if b is not a:
+                break
+            b = self._candidate()
+        return a if self.load(a) <= self.load(b) else b
+
+
+POLICIES = {
+    'alias': AliasTable,
+    'swrr': SmoothWRR,
+    'p2c': PowerOfTwoChoices,
+    'p2c_weighted': lambda servers, weights: PowerOfTwoChoices(servers, weights, weighted=True),
+}
+
+
+def build_selector(policy, servers, weights, ramp=None):
+    """Monta a estrutura de seleção; None se não houver servidor com peso > 0.
+
+    `ramp` é a fração (0–1) do slow-start de cada servidor. As políticas com
+    pesos já a recebem embutida em `weights`; o p2c sem pesos ignora
+    `weights`, então durante a rampa sorteia os candidatos por `ramp`.
+    """
+    ramp = ramp or [1.0] * len(servers)
+    triples = [(s, w, r) for s, w, r in zip(servers, weights, ramp) if w > 0]
+    if not triples:
+        return None
+    servers, weights, ramp = zip(*triples)
+    if policy == 'p2c' and min(ramp) < 1:
+        return PowerOfTwoChoices(servers, ramp, weighted=True)
+    return POLICIES[policy](servers, weights)
@@ -1,18 +1,137 @@
-from flask import Flask, jsonify, render_template_string, request
-import requests, random, time, threading
-from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, has_request_context, jsonify, render_template_string, request
+import requests, random, time, threading, itertools
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeout, wait
+from collections import deque
 import subprocess
 import os
 import signal
+import backend_pool
+import lb_policies
+from circuit_breaker import CircuitBreaker, CLOSED, OPEN
+from health_scheduler import HealthScheduler
+from coalescer import Coalescer
+from prefetch_cache import PrefetchCache
+from admission import AdmissionControl, Overloaded
+from rate_limit import RateLimiter
+import metrics
+import access_log
 
 app = Flask(__name__)
 
+# Log JSON-lines escrito em segundo plano (LB_LOG_FILE, LB_LOG_LEVEL,
+# LB_LOG_SAMPLE, ...); sem LB_LOG_FILE vai para a saída padrão
+log = access_log.AccessLog.from_env('LB')
+
 SERVERS = [
     {'id': 'Server1', 'url': 'http://127.0.0.1:5001', 'weight': 60, 'healthy': True},
     {'id': 'Server2', 'url': 'http://127.0.0.1:5002', 'weight': 30, 'healthy': True},
     {'id': 'Server3', 'url': 'http://127.0.0.1:5003', 'weight': 10, 'healthy': True}
 ]
 
+# --- Métricas (/metrics) --- #
+REQUESTS = metrics.Counter('randint_lb_requests_total', 'Requisições atendidas pelo LB por rota e status.',
+                           ['route', 'status'])
+UPSTREAM_REQUESTS = metrics.Counter('randint_lb_upstream_requests_total',
+                                    'Chamadas aos servidores por resultado (ok/error).', ['server', 'outcome'])
+UPSTREAM_LATENCY = metrics.Histogram('randint_lb_upstream_latency_seconds',
+                                     'Latência das chamadas bem-sucedidas aos servidores.', ['server'])
+HEALTH_TRANSITIONS = metrics.Counter('randint_lb_health_transitions_total',
+                                     'Mudanças de saúde dos servidores.', ['server', 'to'])
+metrics.register_process_metrics()
+
+# --- Seleção de servidores --- #
+# 'alias' = sorteio ponderado O(1) | 'swrr' = round-robin ponderado suave
+# 'p2c' / 'p2c_weighted' = melhor de dois candidatos pela carga (em andamento × EWMA)
+LB_POLICY = os.getenv('LB_POLICY', 'alias')
+selector = None  # reconstruído só quando pesos, política ou saúde mudam
+selector_lock = threading.Lock()
+
+# Pesos efetivos: o peso configurado é reduzido conforme a carga que o
+# servidor relata em /health (p95 acima do alvo e requisições em andamento).
+LB_LOAD_WEIGHTS = os.getenv('LB_LOAD_WEIGHTS', '1') == '1'
+LB_TARGET_P95_MS = float(os.getenv('LB_TARGET_P95_MS', 100))
+LB_INFLIGHT_REF = float(os.getenv('LB_INFLIGHT_REF', 8))
+
+# Slow-start: servidor que volta ao pool começa com uma fração pequena do peso
+# e chega ao peso cheio em LB_SLOW_START_S segundos (0 desliga), em rampa
+# 'linear' ou 'exponential'. No p2c sem pesos a rampa vale para o sorteio
+# dos candidatos (ver lb_policies.build_selector).
+LB_SLOW_START_S = float(os.getenv('LB_SLOW_START_S', 10))
+LB_SLOW_START_MODE = os.getenv('LB_SLOW_START_MODE', 'linear')
+SLOW_START_MIN = 0.05  # fração do peso no instante em que o servidor volta
+
+def slow_start_factor(server):
+    recovered_at = server.get('recovered_at')
+    if recovered_at is None or LB_SLOW_START_S <= 0:
+        return 1.0
+    progress = (time.monotonic() - recovered_at) / LB_SLOW_START_S
+    if progress >= 1:
+        server['recovered_at'] = None
+        return 1.0
+    if LB_SLOW_START_MODE == 'exponential':
+        return SLOW_START_MIN * (1 / SLOW_START_MIN) ** progress
+    return SLOW_START_MIN + (1 - SLOW_START_MIN) * progress
+
+def effective_weight(server):
+    weight = server['weight'] * slow_start_factor(server)
+    load = server.get('load')
+    if not LB_LOAD_WEIGHTS or not load:
+        return weight
+    factor = 1.0
+    p95 = load.get('p95_ms') or 0
+    if p95 > LB_TARGET_P95_MS:
+        factor *= LB_TARGET_P95_MS / p95
+    factor /= 1 + (load.get('inflight') or 0) / LB_INFLIGHT_REF
+    return max(weight * factor, weight * 0.05)
+
+def rebuild_selector():
+    global selector
+    with selector_lock:
+        healthy = [s for s in SERVERS if s['healthy']]
+        for s in healthy:
+            s['effective_weight'] = round(effective_weight(s), 2)
+        selector = lb_policies.build_selector(LB_POLICY, healthy, [s['effective_weight'] for s in healthy],
+                                              ramp=[slow_start_factor(s) for s in healthy])
+
+def set_healthy(server, healthy):
+    """Atualiza a saúde do servidor e refaz a seleção se houve mudança."""
+    if server['healthy'] != healthy:
+        server['healthy'] = healthy
+        HEALTH_TRANSITIONS.inc(server['id'], 'up' if healthy else 'down')
+        if healthy and LB_SLOW_START_S > 0:
+            server['recovered_at'] = time.monotonic()
+        rebuild_selector()
+
+def slow_start_loop():
+    # Enquanto algum servidor está na rampa, refaz a seleção com o peso atual
+    while True:
+        time.sleep(0.5)
+        if any(s.get('recovered_at') is not None for s in SERVERS):
+            rebuild_selector()
+
+rebuild_selector()
+threading.Thread(target=slow_start_loop, daemon=True).start()
+
+# --- Circuit breaker por servidor --- #
+# Abre pela taxa de erros/lentidão numa janela deslizante e alimenta o mesmo
+# campo 'healthy' que os dashboards mostram.
+def on_breaker_change(server, state):
+    log.warning('breaker', server=server['id'], state=state)
+    set_healthy(server, state != OPEN)
+
+breakers = {
+    s['id']: CircuitBreaker(
+        on_change=lambda state, s=s: on_breaker_change(s, state),
+        window_s=float(os.getenv('LB_CB_WINDOW_S', 10)),
+        min_requests=int(os.getenv('LB_CB_MIN_REQUESTS', 5)),
+        error_rate=float(os.getenv('LB_CB_ERROR_RATE', 0.5)),
+        slow_ms=float(os.getenv('LB_CB_SLOW_MS', 1000)),
+        slow_rate=float(os.getenv('LB_CB_SLOW_RATE', 0.8)),
+        open_s=float(os.getenv('LB_CB_OPEN_S', 5)),
+        probes=int(os.getenv('LB_CB_PROBES', 3)),
+    ) for s in SERVERS
+}
+
 # --- Controle de processos dos servidores --- #
 processes = {}  # guarda os processos ativos
 
@@ -32,7 +151,8 @@ def start_server(server_id):
     script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
     proc = subprocess.Popen(["python", script_path], env=env)
     processes[server_id] = proc
-    server['healthy'] = True
+    breakers[server_id].reset()
+    set_healthy(server, True)
     return True, f"{server_id} iniciado na porta {port}."
 
 def stop_server(server_id):
@@ -50,55 +170,800 @@ def stop_server(server_id):
 
     server = next((s for s in SERVERS if s['id'] == server_id), None)
     if server:
-        server['healthy'] = False
+        set_healthy(server, False)
+        backend_pool.discard(server)
 
     return True, f"{server_id} foi encerrado."
 
 executor = ThreadPoolExecutor()
-stats = {'Server1': 0, 'Server2': 0, 'Server3': 0}
-stats_lock = threading.Lock()
+# Requisições atendidas por servidor: contador fatiado por thread (sem lock
+# global no caminho da requisição), somado só quando alguém lê
+served = metrics.Counter('randint_lb_backend_requests_total', 'Requisições atendidas por servidor.', ['server'])
+
+def served_counts():
+    counts = served.collect()
+    return {s['id']: counts.get((s['id'],), 0) for s in SERVERS}
+
+# --- Failover --- #
+LB_MAX_RETRIES = int(os.getenv('LB_MAX_RETRIES', 2))   # tentativas extras por requisição
+LB_DEADLINE_S = float(os.getenv('LB_DEADLINE_S', 3))   # orçamento total de tempo
+retry_stats = {'retries': 0, 'failovers': 0, 'exhausted': 0,
+               'failover_ms_total': 0.0, 'failover_ms_max': 0.0}
+retry_lock = threading.Lock()  # só no caminho de falha
+
+# --- Controle de admissão --- #
+# No máximo LB_MAX_INFLIGHT requisições simultâneas por servidor; sem vaga em
+# nenhum, a requisição espera numa fila de LB_QUEUE_MAX posições por até
+# LB_QUEUE_TIMEOUT_S. Fila cheia ou espera esgotada viram 503 + Retry-After.
+# Na fila, as classes 'interactive' (um número) e 'bulk' (lotes, streams e
+# refills do cache) dividem as vagas que abrem na proporção LB_SHARE_*.
+PRIORITY_CLASSES = ('interactive', 'bulk')
+admission = AdmissionControl(max_inflight=int(os.getenv('LB_MAX_INFLIGHT', 32)),
+                             max_queue=int(os.getenv('LB_QUEUE_MAX', 256)),
+                             queue_timeout_s=float(os.getenv('LB_QUEUE_TIMEOUT_S', 1)),
+                             shares={'interactive': float(os.getenv('LB_SHARE_INTERACTIVE', 4)),
+                                     'bulk': float(os.getenv('LB_SHARE_BULK', 1))})
+
+def request_priority():
+    """Classe da requisição atual; fora de uma requisição (refill do cache) é 'bulk'."""
+    return g.get('priority', 'interactive') if has_request_context() else 'bulk'
 
 def health_check(server):
+    breaker = breakers[server['id']]
     try:
-        resp = requests.get(f"{server['url']}/health", timeout=1)
-        server['healthy'] = resp.status_code == 200
+        resp = backend_pool.health_get(server, '/health', timeout=1)
+        ok = resp.status_code == 200
+        if ok:
+            server['load'] = resp.json()  # carga relatada → pesos efetivos
     except:
-        server['healthy'] = False
+        ok = False
+    if not ok:
+        breaker.trip()
+    elif breaker.poll() == CLOSED:
+        # Aberto/meio-aberto: quem decide a volta é o próprio breaker
+        set_healthy(server, True)
+    if ok and LB_LOAD_WEIGHTS and server['healthy']:
+        rebuild_selector()
+    return ok
+
+# Intervalo curto para servidor fora do ar ou recém-recuperado, longo quando estável
+health = HealthScheduler(SERVERS, health_check,
+                         min_interval=float(os.getenv('LB_HEALTH_MIN_S', 1)),
+                         max_interval=float(os.getenv('LB_HEALTH_MAX_S', 10))).start()
+
+# --- Ajuste automático de pesos --- #
+# A cada LB_AUTOTUNE_S segundos move o peso de cada servidor em direção a uma
+# fatia proporcional à sua velocidade (1 / EWMA da latência, descontada a taxa
+# de erros), amortecido por LB_AUTOTUNE_DAMPING e limitado a [min, max].
+# Servidores com peso definido manualmente ficam travados até /autotune?unlock=.
+autotune = {
+    'enabled': os.getenv('LB_AUTOTUNE', '0') == '1',
+    'interval_s': float(os.getenv('LB_AUTOTUNE_S', 10)),
+    'damping': float(os.getenv('LB_AUTOTUNE_DAMPING', 0.5)),
+    'min_weight': int(os.getenv('LB_AUTOTUNE_MIN', 1)),
+    'max_weight': int(os.getenv('LB_AUTOTUNE_MAX', 100)),
+    'locked': set(),
+}
+autotune_log = deque(maxlen=200)
+_autotune_counts = {}
 
-def periodic_health():
+def autotune_step():
+    now = time.time()
+    counts = served_counts()
+    candidates = [s for s in SERVERS
+                  if s['healthy'] and s['id'] not in autotune['locked'] and s.get('ewma_ms')]
+    if len(candidates) < 2:
+        _autotune_counts.update(counts)
+        return
+
+    scores = {}
+    for s in candidates:
+        error_rate = breakers[s['id']].stats()['window_error_rate']
+        scores[s['id']] = (1 - error_rate) / s['ewma_ms']
+    total_weight = sum(s['weight'] for s in candidates)
+    total_score = sum(scores.values()) or 1
+    avg_ewma = sum(s['ewma_ms'] for s in candidates) / len(candidates)
+
+    changed = False
+    for s in candidates:
+        target = total_weight * scores[s['id']] / total_score
+        new_weight = round(s['weight'] + autotune['damping'] * (target - s['weight']))
+        new_weight = min(max(new_weight, autotune['min_weight']), autotune['max_weight'])
+        if new_weight == s['weight']:
+            continue
+        rps = (counts[s['id']] - _autotune_counts.get(s['id'], 0)) / autotune['interval_s']
+        reason = (f"EWMA {s['ewma_ms']:.0f} ms (média {avg_ewma:.0f} ms), {rps:.1f} req/s, "
+                  f"erros {breakers[s['id']].stats()['window_error_rate']:.0%}")
+        autotune_log.append({'time': now, 'server': s['id'], 'old': s['weight'],
+                             'new': new_weight, 'reason': reason})
+        log.info('autotune', server=s['id'], old=s['weight'], new=new_weight, reason=reason)
+        s['weight'] = new_weight
+        changed = True
+    _autotune_counts.update(counts)
+    if changed:
+        rebuild_selector()
+
+def autotune_loop():
     while True:
-        time.sleep(5)
-        for s in SERVERS:
-            executor.submit(health_check, s)
+        time.sleep(autotune['interval_s'])
+        if autotune['enabled']:
+            autotune_step()
+
+threading.Thread(target=autotune_loop, daemon=True).start()
+backend_pool.start_janitor()
+
+def passthrough_headers(resp, server):
+    """Cabeçalhos repassados junto com respostas binárias do servidor."""
+    headers = {k: v for k, v in resp.headers.items() if k.startswith('X-')}
+    headers['X-Request-To'] = server['url']
+    headers['X-Backend-Id'] = server['id']
+    headers['X-Upstream-Latency-Ms'] = f"{resp.elapsed.total_seconds() * 1000:.1f}"
+    return headers
+
+def relay(resp):
+    """Repassa o corpo bloco a bloco, sem acumular tudo em memória; se o
+    cliente desconectar o gerador é fechado e a conexão também."""
+    try:
+        for block in resp.iter_content(chunk_size=64 * 1024):
+            yield block
+    finally:
+        resp.close()
+
+# --- Modo pass-through --- #
+# O corpo do backend vai para o cliente byte a byte, sem decodificar e
+# recodificar o JSON; request_to, id do backend e latência seguem nos
+# cabeçalhos X-Request-To, X-Backend-Id e X-Upstream-Latency-Ms.
+# Padrão desligado (o JSON ganha o campo request_to); por requisição use
+# ?passthrough=1 ou o cabeçalho X-LB-Passthrough: 1.
+LB_PASSTHROUGH = os.getenv('LB_PASSTHROUGH', '0') == '1'
+
+def wants_passthrough(params):
+    flag = params.pop('passthrough', None)
+    if flag is not None:
+        return flag == '1'
+    return LB_PASSTHROUGH or request.headers.get('X-LB-Passthrough') == '1'
+
+def call_backend(server, path, **kwargs):
+    """GET no backend registrando requisições em andamento e a latência."""
+    lb_policies.record_start(server)
+    start = time.perf_counter()
+    latency_ms = None
+    try:
+        resp = backend_pool.get(server, path, **kwargs)
+        latency_ms = (time.perf_counter() - start) * 1000
+        return resp
+    finally:
+        lb_policies.record_end(server, latency_ms)
+
+def choose_server(exclude=()):
+    """Escolhe um servidor saudável pela política atual, fora de `exclude` (ou None)."""
+    current = selector
+    if current is None:
+        return None
+    for _ in range(4):
+        server = current.pick()
+        if server['id'] not in exclude:
+            return server
+    rest = [s for s in SERVERS if s['healthy'] and s['id'] not in exclude]
+    return random.choice(rest) if rest else None
+
+def acquire_server(exclude, deadline, priority, planned=None):
+    """Escolhe um servidor com vaga, esperando na fila de admissão da classe
+    `priority` se todos estiverem no limite. Devolve o servidor (com a vaga
+    reservada) ou None; levanta Overloaded se a fila não der conta.
+    O escolhido é anotado em `planned` (lista) antes de entrar na fila."""
+    chosen = choose_server(exclude)
+    if chosen is None:
+        return None
+    if planned is not None:
+        planned.append(chosen['id'])
+    # O escolhido primeiro; lotado, transborda para qualquer outro com vaga
+    others = [s['id'] for s in SERVERS
+              if s['healthy'] and s['id'] not in exclude and s is not chosen]
+    server_id = admission.acquire([chosen['id'], *others], priority, deadline)
+    return next(s for s in SERVERS if s['id'] == server_id)
+
+def forward(path, params, headers, read_timeout=None, exclude=(), tried=None, priority=None,
+            cancel=None, track_latency=False, **kwargs):
+    """Envia a requisição com failover para outro servidor saudável.
+
+    Faz até LB_MAX_RETRIES novas tentativas, sem repetir servidor, enquanto
+    houver tempo no orçamento LB_DEADLINE_S. Servidores em `exclude` não são
+    usados; os ids escolhidos são anotados em `tried` (se for uma lista) já
+    antes da fila de admissão, para o hedging não mandar a cópia ao mesmo.
+    `priority` é a classe na fila de admissão (padrão: a da requisição atual).
+    Com `cancel` (threading.Event) ligado, desiste antes de ocupar uma vaga ou
+    de tentar outro servidor. `track_latency` (pedidos de um número) alimenta
+    o limiar do hedging e a contagem de chamadas lentas do breaker.
+    Devolve (servidor, resposta) ou (None, lista de servidores que falharam);
+    levanta Overloaded se todos estiverem no limite de concorrência.
+    """
+    priority = priority or request_priority()
+    deadline = time.monotonic() + LB_DEADLINE_S
+    failed = []
+    skipped = set()  # breaker meio-aberto sem vaga para teste
+    first_failure = None
+    while len(failed) <= LB_MAX_RETRIES:
+        if cancel is not None and cancel.is_set():
+            return None, failed
+        if deadline - time.monotonic() <= 0:
+            break
+        chosen = acquire_server({s['id'] for s in failed} | skipped | set(exclude), deadline, priority, tried)
+        if chosen is not None and cancel is not None and cancel.is_set():
+            admission.release(chosen['id'])  # a outra cópia já venceu
+            return None, failed
+        remaining = deadline - time.monotonic()
+        if chosen is None or remaining <= 0:
+            if chosen is not None:
+                admission.release(chosen['id'])
+            break
+        breaker = breakers[chosen['id']]
+        if not breaker.allow():
+            admission.release(chosen['id'])
+            skipped.add(chosen['id'])
+            continue
+        if tried is not None and chosen['id'] not in tried:
+            tried.append(chosen['id'])  # a fila transbordou para outro servidor
+        timeout = (remaining, read_timeout) if read_timeout else remaining
+        start = time.perf_counter()
+        try:
+            resp = call_backend(chosen, path, params=params, headers=headers, timeout=timeout, **kwargs)
+            if resp.status_code >= 500:
+                resp.close()
+                raise requests.HTTPError(f"HTTP {resp.status_code}")
+        except requests.RequestException as e:
+            log.warning('upstream_failure', server=chosen['id'], error=str(e))
+            breaker.record(False)
+            UPSTREAM_REQUESTS.inc(chosen['id'], 'error')
+            failed.append(chosen)
+            first_failure = first_failure or time.perf_counter()
+            continue
+        finally:
+            # Com stream=True a vaga é liberada ao receber os cabeçalhos
+            admission.release(chosen['id'])
+        latency_ms = (time.perf_counter() - start) * 1000
+        # Lentidão só conta em pedidos de um número: lotes e fluxos demoram
+        # pelo tamanho do corpo, não porque o servidor está mal
+        breaker.record(True, latency_ms if track_latency else None)
+        UPSTREAM_REQUESTS.inc(chosen['id'], 'ok')
+        UPSTREAM_LATENCY.observe(latency_ms / 1000, chosen['id'])
+        if track_latency:
+            record_latency(latency_ms)
+
+        if failed:
+            failover_ms = (time.perf_counter() - first_failure) * 1000
+            with retry_lock:
+                retry_stats['retries'] += len(failed)
+                retry_stats['failovers'] += 1
+                retry_stats['failover_ms_total'] += failover_ms
+                retry_stats['failover_ms_max'] = max(retry_stats['failover_ms_max'], failover_ms)
+        return chosen, resp
+
+    with retry_lock:
+        retry_stats['retries'] += max(len(failed) - 1, 0)
+        retry_stats['exhausted'] += 1
+    return None, failed
+
+# --- Hedging --- #
+# Se um pedido de um número não responder até o p95 observado (só desses
+# pedidos), manda uma cópia para outro servidor e usa a que terminar
+# primeiro. O orçamento LB_HEDGE_BUDGET limita as cópias a uma fração das
+# requisições (ex.: 0.05 = no máximo 5% a mais).
+LB_HEDGE = os.getenv('LB_HEDGE', '0') == '1'  # ou por requisição: X-Hedge: 1
+LB_HEDGE_BUDGET = float(os.getenv('LB_HEDGE_BUDGET', 0.05))
+LB_HEDGE_MIN_MS = float(os.getenv('LB_HEDGE_MIN_MS', 20))
+HEDGE_MIN_SAMPLES = 20
+# Originais e cópias em pools separados: as cópias não esperam atrás das
+# originais, e o pool das originais comporta tudo o que a admissão deixa
+# passar (vagas + fila), então não vira um limite a mais. Com o pool todo
+# ocupado a original roda na própria thread, sem hedging, em vez de esperar
+# numa fila sem prazo fora da admissão.
+PRIMARY_WORKERS = admission.max_inflight * len(SERVERS) + admission.max_queue
+primary_executor = ThreadPoolExecutor(max_workers=PRIMARY_WORKERS, thread_name_prefix='hedge-primary')
+primary_slots = threading.BoundedSemaphore(PRIMARY_WORKERS)
+# Espera máxima pela original/cópia: prazo das tentativas + fila de admissão
+HEDGE_WAIT_S = LB_DEADLINE_S + admission.queue_timeout_s
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LB_HEDGE_WORKERS', 16)),
+                                    thread_name_prefix='hedge')
+hedge_lock = threading.Lock()
+# Latências recentes com sucesso (ms): ~1000 amostras divididas entre as fatias
+latency_window = metrics.ShardedLog(maxlen=max(1000 // metrics.SHARDS, 16))
+latency_samples = itertools.count(1)
+hedge_stats = {'samples': 0, 'threshold_ms': LB_HEDGE_MIN_MS, 'requests': 0,
+               'hedges': 0, 'wins': 0, 'budget_denied': 0, 'tokens': 0.0}
+
+def record_latency(latency_ms):
+    latency_window.append(latency_ms)
+    samples = hedge_stats['samples'] = next(latency_samples)
+    if samples % 50 == 1:  # recalcula o p95 de tempos em tempos
+        ordered = sorted(ms for _, ms in latency_window.recent(1000))
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        with hedge_lock:
+            hedge_stats['threshold_ms'] = max(p95, LB_HEDGE_MIN_MS)
+
+def hedge_copy(path, params, headers, exclude, priority, cancel):
+    # Sem vaga para a cópia só a original continua valendo
+    try:
+        return forward(path, params, headers, exclude=exclude, priority=priority,
+                       cancel=cancel, track_latency=True)
+    except Overloaded:
+        return None, []
+
+def discard_loser(future):
+    """Cancela a cópia perdedora; se já estiver em andamento, fecha a resposta
+    dela assim que chegar (a vaga de admissão é liberada no fim da chamada)."""
+    if future.cancel():
+        return
+
+    def close(f):
+        try:
+            chosen, resp = f.result()
+        except Exception:
+            return
+        if chosen is not None:
+            resp.close()
+
+    future.add_done_callback(close)
+
+def await_primary(primary, cancel):
+    try:
+        return primary.result(timeout=HEDGE_WAIT_S)
+    except FuturesTimeout:
+        cancel.set()
+        discard_loser(primary)
+        raise Overloaded('hedging sem resposta no prazo', admission.retry_after) from None
+
+def hedged_forward(path, params, headers):
+    with hedge_lock:
+        hedge_stats['requests'] += 1
+        hedge_stats['tokens'] = min(hedge_stats['tokens'] + LB_HEDGE_BUDGET, 10)
+        threshold_ms = hedge_stats['threshold_ms']
+        warmed_up = hedge_stats['samples'] >= HEDGE_MIN_SAMPLES
+
+    tried = []
+    priority = request_priority()  # as threads do hedging não veem o contexto da requisição
+    if not primary_slots.acquire(blocking=False):
+        return forward(path, params, headers, priority=priority, track_latency=True)
+    cancel = threading.Event()
+    primary = primary_executor.submit(forward, path, params, headers, tried=tried, priority=priority,
+                                      cancel=cancel, track_latency=True)
+    primary.add_done_callback(lambda f: primary_slots.release())
+    if not warmed_up:
+        return await_primary(primary, cancel)
+    try:
+        return primary.result(timeout=threshold_ms / 1000)
+    except FuturesTimeout:
+        pass
+
+    with hedge_lock:
+        allowed = hedge_stats['tokens'] >= 1
+        if allowed:
+            hedge_stats['tokens'] -= 1
+            hedge_stats['hedges'] += 1
+        else:
+            hedge_stats['budget_denied'] += 1
+    if not allowed:
+        return await_primary(primary, cancel)
+
+    # A cópia vai para um servidor diferente; a perdedora é cancelada
+    hedge = hedge_executor.submit(hedge_copy, path, params, headers, set(tried), priority, cancel)
+    pending, fallback = {primary, hedge}, None
+    limit = time.monotonic() + HEDGE_WAIT_S
+    while pending:
+        done, pending = wait(pending, timeout=max(limit - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            cancel.set()
+            for loser in pending:
+                discard_loser(loser)
+            raise Overloaded('hedging sem resposta no prazo', admission.retry_after)
+        for future in done:
+            try:
+                chosen, resp = future.result()
+            except Exception:
+                cancel.set()
+                for loser in pending:
+                    discard_loser(loser)
+                raise
+            if chosen is not None:
+                cancel.set()
+                for loser in pending:
+                    discard_loser(loser)
+                if future is hedge:
+                    with hedge_lock:
+                        hedge_stats['wins'] += 1
+                return chosen, resp
+            fallback = fallback or (chosen, resp)
+    return fallback
 
-threading.Thread(target=periodic_health, daemon=True).start()
+def wants_hedge():
+    return LB_HEDGE or request.headers.get('X-Hedge') == '1'
+
+def failure_response(failed):
+    if not failed:
+        return jsonify({'error': 'No servers'}), 503
+    ids = ', '.join(s['id'] for s in failed)
+    return jsonify({'error': f"{ids} está offline"}), 500
+
+@app.errorhandler(Overloaded)
+def overloaded_response(e):
+    log.warning('shed', reason=e.reason, route=request.endpoint)
+    resp = jsonify({'error': f"Load Balancer sobrecarregado: {e.reason}"})
+    resp.status_code = 503
+    resp.headers['Retry-After'] = str(e.retry_after)
+    return resp
+
+class BackendUnavailable(Exception):
+    def __init__(self, failed):
+        super().__init__('Nenhum servidor respondeu')
+        self.failed = failed
+
+def fetch_batch(key, count):
+    """Busca `count` números do intervalo `key` = (min, max) num único lote."""
+    min_val, max_val = key
+    params = {'min': min_val, 'max': max_val, 'count': count}
+    chosen, resp = forward('/generate', params, {'Accept': 'application/json'})
+    if chosen is None:
+        raise BackendUnavailable(resp)
+    data = resp.json()
+    if resp.status_code != 200:
+        raise BackendUnavailable([chosen])
+    # Sem served.inc: o lote não é uma requisição de cliente; cada número
+    # conta para o servidor que o gerou quando é entregue (cache/coalescência)
+    return chosen, data['numbers']
+
+# --- Coalescência --- #
+# Pedidos de um único número com o mesmo (min, max) esperam até LB_COALESCE_MS
+# (ou LB_COALESCE_MAX pedidos) e viram uma só chamada /generate?count=N.
+# LB_COALESCE_MS=0 desliga.
+coalescer = Coalescer(fetch_batch,
+                      window_ms=float(os.getenv('LB_COALESCE_MS', 0)),
+                      max_batch=int(os.getenv('LB_COALESCE_MAX', 64)))
+
+# --- Cache de pré-busca --- #
+# Intervalos quentes são servidos de um buffer local reabastecido em lotes
+# (LB_CACHE=1 liga). Clientes que exigem geração na hora usam ?fresh=1.
+LB_CACHE = os.getenv('LB_CACHE', '0') == '1'
+cache = PrefetchCache(fetch_batch, executor,
+                      batch=int(os.getenv('LB_CACHE_BATCH', 1024)),
+                      low_water=int(os.getenv('LB_CACHE_LOW_WATER', 256)),
+                      max_numbers=int(os.getenv('LB_CACHE_MAX_NUMBERS', 1_000_000)),
+                      max_ranges=int(os.getenv('LB_CACHE_MAX_RANGES', 64)),
+                      admit_after=int(os.getenv('LB_CACHE_ADMIT_AFTER', 2)))
+
+def range_key(params):
+    """Chave (min, max) de um pedido JSON de um único número; senão None."""
+    if set(params) - {'min', 'max'}:
+        return None
+    if request.accept_mimetypes.best_match(['application/json', 'application/octet-stream',
+                                            'application/x-npy']) != 'application/json':
+        return None
+    try:
+        key = (int(params['min']), int(params['max']))
+    except (KeyError, ValueError):
+        return None
+    return key if key[0] < key[1] else None
+
+def generate_coalesced(key):
+    try:
+        chosen, number, batch_size = coalescer.submit(key)
+    except BackendUnavailable as e:
+        return failure_response(e.failed)
+    served.inc(chosen['id'])
+    note_backend(chosen, number=number, coalesced=batch_size)
+    return jsonify({
+        'number': number,
+        'from_server': chosen['id'],
+        'timestamp': time.time(),
+        'request_to': chosen['url'],
+        'coalesced': batch_size,
+    })
+
+# --- Limite de taxa por cliente --- #
+# Token bucket por cliente (chave do cabeçalho X-API-Key, se estiver em
+# LB_API_KEYS, ou o IP), com baldes separados: pedidos de um número gastam
+# 1 token; lotes (?count=N) e fluxos (/stream?limit=N) gastam N tokens de um
+# balde próprio. Desligado por padrão (LB_RATE_LIMIT=1 liga).
+LB_RATE_LIMIT = os.getenv('LB_RATE_LIMIT', '0') == '1'
+# Só chaves conhecidas ganham balde próprio: aceitar qualquer X-API-Key
+# deixaria o cliente trocar de chave a cada pedido e escapar do limite
+LB_API_KEYS = {k.strip() for k in os.getenv('LB_API_KEYS', '').split(',') if k.strip()}
+rate_limits = {
+    'single': RateLimiter(rate=float(os.getenv('LB_RL_RATE', 100)),
+                          burst=float(os.getenv('LB_RL_BURST', 200))),
+    'batch': RateLimiter(rate=float(os.getenv('LB_RL_BATCH_RATE', 200_000)),
+                         burst=float(os.getenv('LB_RL_BATCH_BURST', 1_000_000))),
+}
+for limiter in rate_limits.values():
+    limiter.start_janitor(float(os.getenv('LB_RL_CLEANUP_S', 30)))
+
+def client_key():
+    api_key = request.headers.get('X-API-Key')
+    if api_key in LB_API_KEYS:
+        return 'key:' + api_key
+    return request.remote_addr
+
+def check_rate_limit(params, stream=False):
+    """None se o cliente ainda tem saldo; senão a resposta 429.
+
+    Um /stream sem `limit` não tem fim, então custa o balde inteiro."""
+    if not LB_RATE_LIMIT:
+        return None
+    kind = 'batch' if stream or 'count' in params else 'single'
+    limiter = rate_limits[kind]
+    field = 'limit' if stream else 'count'
+    try:
+        cost = max(int(params[field]), 1) if field in params else (limiter.burst if stream else 1)
+    except ValueError:
+        cost = 1  # o servidor devolve o 400
+    ok, remaining, wait_s = limiter.take(client_key(), cost)
+    g.rate_limit = {
+        'X-RateLimit-Class': kind,
+        'X-RateLimit-Limit': str(int(limiter.burst)),
+        'X-RateLimit-Remaining': str(int(remaining)),
+    }
+    if ok:
+        return None
+    g.rate_limit['Retry-After'] = str(int(wait_s) + 1)
+    return jsonify({'error': f"Limite de requisições excedido ({kind}). Tente de novo em {wait_s:.1f}s"}), 429
+
+@app.after_request
+def add_rate_limit_headers(resp):
+    resp.headers.update(g.get('rate_limit', {}))
+    return resp
+
+# --- Classes de prioridade --- #
+# Cabeçalho X-Priority: interactive|bulk; sem ele, lotes (?count=) e /stream
+# são 'bulk' e o resto 'interactive'. A latência de cada classe é guardada
+# para conferir o isolamento no dashboard.
+class_latency = {c: metrics.ShardedLog(maxlen=max(1000 // metrics.SHARDS, 16)) for c in PRIORITY_CLASSES}
+
+@app.before_request
+def classify_request():
+    if request.path not in ('/generate', '/stream'):
+        return
+    priority = request.headers.get('X-Priority', '').lower()
+    if priority not in PRIORITY_CLASSES:
+        priority = 'bulk' if request.path == '/stream' or 'count' in request.args else 'interactive'
+    g.priority = priority
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_class_latency(resp):
+    if 'started' in g:
+        elapsed_ms = (time.perf_counter() - g.started) * 1000
+        class_latency[g.priority].append(elapsed_ms)
+        # Uma linha de acesso por requisição, montada aqui e escrita em segundo plano
+        log.access(route=request.endpoint, status=resp.status_code, ms=round(elapsed_ms, 2),
+                   client=request.remote_addr, priority=g.priority,
+                   server=g.get('backend'), **g.get('log_fields', {}))
+    return resp
+
+def note_backend(server, **fields):
+    """Anota o servidor (e detalhes) que vão na linha de acesso da requisição."""
+    g.backend = server['id']
+    g.log_fields = fields
+
+def class_latency_stats():
+    def pct(ordered, q):
+        return round(ordered[int(q * (len(ordered) - 1))], 1) if ordered else 0
+
+    samples = {c: sorted(ms for _, ms in entries.recent(1000)) for c, entries in class_latency.items()}
+    return {c: {'count': len(v), 'p50_ms': pct(v, 0.50), 'p95_ms': pct(v, 0.95), 'p99_ms': pct(v, 0.99)}
+            for c, v in samples.items()}
 
 @app.route('/generate')
 def generate():
-    healthy = [s for s in SERVERS if s['healthy']]
-    if not healthy:
-        return jsonify({'error': 'No servers'}), 503
+    # Pega parâmetros da requisição (ex.: ?min=20&max=50) e repassa pro servidor
+    params = request.args.to_dict()
+    limited = check_rate_limit(params)
+    if limited:
+        return limited
+    fresh = params.pop('fresh', '0') == '1'
+    if wants_passthrough(params):
+        return generate_passthrough(params)
+    key = range_key(params)
 
-    weights = [s['weight'] for s in healthy]
-    chosen = random.choices(healthy, weights=weights)[0]
+    if key is not None and LB_CACHE and not fresh:
+        item = cache.get(key)
+        if item is not None:
+            number, chosen = item
+            served.inc(chosen['id'])  # conta para quem gerou o número
+            note_backend(chosen, number=number, cached=True)
+            return jsonify({
+                'number': number,
+                'from_server': chosen['id'],
+                'timestamp': time.time(),
+                'request_to': chosen['url'],
+                'cached': True,
+            })
+
+    if key is not None and coalescer.window_ms > 0:
+        return generate_coalesced(key)
+
+    headers = {'Accept': request.headers.get('Accept', 'application/json')}
+    single = 'count' not in params  # só pedidos de um número usam o hedging
+    if single and wants_hedge():
+        chosen, resp = hedged_forward('/generate', params, headers)
+    else:
+        chosen, resp = forward('/generate', params, headers, track_latency=single)
+    if chosen is None:
+        return failure_response(resp)
+
+    served.inc(chosen['id'])
+
+    # Formatos binários (octet-stream / npy) passam intactos pelo LB
+    if not resp.headers.get('Content-Type', '').startswith('application/json'):
+        note_backend(chosen, binary=True)
+        return Response(resp.content, status=resp.status_code,
+                        content_type=resp.headers.get('Content-Type'),
+                        headers=passthrough_headers(resp, chosen))
+
+    data = resp.json()
+    data['request_to'] = chosen['url']
+    if resp.status_code != 200:  # ex.: intervalo inválido
+        return jsonify(data), resp.status_code
+
+    if 'numbers' in data:
+        note_backend(chosen, count=data['count'])
+    else:
+        note_backend(chosen, number=data['number'])
+    return jsonify(data)
 
-    # Pega parâmetros da requisição (ex.: ?min=20&max=50)
+def generate_passthrough(params):
+    """/generate sem reescrever o corpo: sempre direto no backend (sem cache
+    nem coalescência), com o roteamento só nos cabeçalhos."""
+    headers = {'Accept': request.headers.get('Accept', 'application/json')}
+    single = 'count' not in params
+    if single and wants_hedge():
+        # O hedging precisa da resposta inteira para escolher a vencedora
+        chosen, resp = hedged_forward('/generate', params, headers)
+        body = resp.content if chosen is not None else None
+    else:
+        chosen, resp = forward('/generate', params, headers, stream=True, track_latency=single)
+        body = relay(resp) if chosen is not None else None
+    if chosen is None:
+        return failure_response(resp)
+
+    served.inc(chosen['id'])
+    note_backend(chosen, passthrough=True)
+    out_headers = passthrough_headers(resp, chosen)
+    if 'Content-Length' in resp.headers:
+        out_headers['Content-Length'] = resp.headers['Content-Length']
+    return Response(body, status=resp.status_code,
+                    content_type=resp.headers.get('Content-Type'),
+                    headers=out_headers)
+
+@app.route('/stream')
+def stream():
     params = request.args.to_dict()
+    limited = check_rate_limit(params, stream=True)
+    if limited:
+        return limited
+    headers = {'Accept': request.headers.get('Accept', 'text/plain')}
+    chosen, resp = forward('/stream', params, headers, read_timeout=30, stream=True)
+    if chosen is None:
+        return failure_response(resp)
+
+    served.inc(chosen['id'])
+    note_backend(chosen)
+    return Response(relay(resp), status=resp.status_code,
+                    content_type=resp.headers.get('Content-Type'),
+                    headers=passthrough_headers(resp, chosen))
+
+def hedging_stats():
+    with hedge_lock:
+        requests_ = hedge_stats['requests']
+        return {
+            'enabled': LB_HEDGE,
+            'threshold_ms': round(hedge_stats['threshold_ms'], 1),
+            'requests': requests_,
+            'hedges': hedge_stats['hedges'],
+            'hedge_rate': round(hedge_stats['hedges'] / requests_, 4) if requests_ else 0,
+            'wins': hedge_stats['wins'],
+            'budget_denied': hedge_stats['budget_denied'],
+        }
+
+@app.after_request
+def count_request(resp):
+    if request.endpoint != 'metrics_route':
+        REQUESTS.inc(request.endpoint or 'unknown', resp.status_code)
+    return resp
+
+metrics.Callback('randint_lb_server_healthy', 'Servidor no pool (1) ou fora (0).', labels=['server'],
+                 fn=lambda: {(s['id'],): int(s['healthy']) for s in SERVERS})
+metrics.Callback('randint_lb_upstream_inflight', 'Chamadas em andamento por servidor.', labels=['server'],
+                 fn=lambda: {(s['id'],): s.get('inflight', 0) for s in SERVERS})
+metrics.Callback('randint_lb_breaker_trips_total', 'Aberturas do circuit breaker.', 'counter', labels=['server'],
+                 fn=lambda: {(sid,): b.stats()['trips'] for sid, b in breakers.items()})
+metrics.Callback('randint_lb_admission_queue_length', 'Requisições esperando vaga, por classe.',
+                 labels=['class'], fn=lambda: {(c,): v['waiting'] for c, v in admission.stats()['classes'].items()})
+def shed_counts():
+    st = admission.stats()
+    return {('queue_full',): st['shed_queue_full'], ('timeout',): st['shed_timeout']}
 
+metrics.Callback('randint_lb_shed_total', 'Requisições recusadas com 503 pela admissão.', 'counter',
+                 labels=['reason'], fn=shed_counts)
+metrics.Callback('randint_lb_rate_limited_total', 'Requisições recusadas com 429.', 'counter',
+                 labels=['class'], fn=lambda: {(k,): rl.stats()['rejected'] for k, rl in rate_limits.items()})
+metrics.Callback('randint_lb_hedges_total', 'Cópias enviadas pelo hedging.', 'counter',
+                 fn=lambda: hedge_stats['hedges'])
+
+metrics.Callback('randint_lb_log_dropped_total', 'Registros de log descartados com a fila cheia.',
+                 'counter', fn=lambda: log.stats()['dropped'])
+metrics.Callback('randint_lb_log_queue_length', 'Registros de log esperando a escrita.',
+                 fn=lambda: log.queue.qsize())
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/stats')
+def stats_route():
+    with retry_lock:
+        retries = dict(retry_stats)
+    failovers = retries['failovers']
+    return jsonify({
+        'requests': served_counts(),
+        'retries': {
+            **retries,
+            'failover_ms_avg': round(retries['failover_ms_total'] / failovers, 1) if failovers else 0,
+        },
+        'servers': {
+            s['id']: {'weight': s['weight'], 'effective_weight': s.get('effective_weight', s['weight']),
+                      'slow_start': s.get('recovered_at') is not None, 'load': s.get('load')}
+            for s in SERVERS
+        },
+        'health': health.stats(),
+        'autotune': {'enabled': autotune['enabled'], 'locked': sorted(autotune['locked']),
+                     'log': list(autotune_log)[-20:]},
+        'breakers': {sid: b.stats() for sid, b in breakers.items()},
+        'hedging': hedging_stats(),
+        'admission': admission.stats(),
+        'latency_by_class': class_latency_stats(),
+        'rate_limit': {kind: limiter.stats() for kind, limiter in rate_limits.items()},
+        'coalescing': coalescer.stats(),
+        'cache': {'enabled': LB_CACHE, **cache.stats()},
+        'log': log.stats(),
+    })
+
+@app.route('/set_log')
+def set_log():
+    level = request.args.get('level', log.stats()['level'])
     try:
-        # Repassa os mesmos parâmetros pro servidor escolhido
-        resp = requests.get(f"{chosen['url']}/generate", params=params, timeout=3)
-        data = resp.json()
-        data['request_to'] = chosen['url']
+        sample = float(request.args.get('sample', log.sample))
+    except ValueError:
+        sample = -1
+    if level not in access_log.LEVELS or not 0 <= sample <= 1:
+        return jsonify({'error': f"Use /set_log?level=({'|'.join(access_log.LEVELS)})&sample=0.1"}), 400
+    log.set_level(level)
+    log.sample = sample
+    log.info('log', level=level, sample=sample)
+    return jsonify(log.stats())
 
-        with stats_lock:
-            stats[chosen['id']] += 1
+@app.route('/set_cache')
+def set_cache():
+    global LB_CACHE
+    enabled = request.args.get('enabled')
+    if enabled not in ('0', '1'):
+        return jsonify({'error': 'Use /set_cache?enabled=1 (ou 0 para desligar e limpar)'}), 400
+    LB_CACHE = enabled == '1'
+    if not LB_CACHE:
+        cache.clear()
+    log.info('cache', enabled=LB_CACHE)
+    return jsonify({'enabled': LB_CACHE, **cache.stats()})
 
-        print(f"LB → {chosen['id']} → {data['number']}")
-        return jsonify(data)
-    except:
-        chosen['healthy'] = False
-        return jsonify({'error': f"{chosen['id']} está offline"}), 500
+@app.route('/set_coalesce')
+def set_coalesce():
+    window_ms = request.args.get('window_ms', type=float)
+    max_batch = request.args.get('max_batch', type=int)
+    if (window_ms is not None and window_ms < 0) or (max_batch is not None and max_batch < 1):
+        return jsonify({'error': 'Use /set_coalesce?window_ms=1&max_batch=64 (0 ms desliga)'}), 400
+    if window_ms is not None:
+        coalescer.window_ms = window_ms
+    if max_batch is not None:
+        coalescer.max_batch = max_batch
+    log.info('coalesce', window_ms=coalescer.window_ms, max_batch=coalescer.max_batch)
+    return jsonify(coalescer.stats())
 
 @app.route('/set_weight')
 def set_weight():
@@ -114,7 +979,9 @@ def set_weight():
         if s['id'].lower() == server_id.lower():
             old_weight = s['weight']
             s['weight'] = new_weight
-            print(f"[UPDATE] Peso de {server_id} alterado: {old_weight} → {new_weight}")
+            autotune['locked'].add(s['id'])  # ajuste manual tem prioridade
+            rebuild_selector()
+            log.info('weight', server=server_id, old=old_weight, new=new_weight)
             return jsonify({
                 'message': f"Peso de {server_id} atualizado com sucesso.",
                 'old_weight': old_weight,
@@ -123,12 +990,47 @@ def set_weight():
 
     return jsonify({'error': 'Servidor não encontrado.'}), 404
 
+@app.route('/autotune')
+def autotune_route():
+    """Liga/desliga o ajuste automático e trava/destrava servidores.
+
+    Ex.: /autotune?enabled=1, /autotune?lock=Server1, /autotune?unlock=Server1
+    """
+    ids = {s['id'] for s in SERVERS}
+    enabled = request.args.get('enabled')
+    if enabled is not None:
+        autotune['enabled'] = enabled == '1'
+    for param, action in (('lock', autotune['locked'].add), ('unlock', autotune['locked'].discard)):
+        server_id = request.args.get(param)
+        if server_id is not None:
+            if server_id not in ids:
+                return jsonify({'error': 'Servidor não encontrado.'}), 404
+            action(server_id)
+    return jsonify({
+        'enabled': autotune['enabled'],
+        'locked': sorted(autotune['locked']),
+        'log': list(autotune_log)[-20:],
+    })
+
+@app.route('/set_policy')
+def set_policy():
+    global LB_POLICY
+    policy = request.args.get('policy', '')
+    if policy not in lb_policies.POLICIES:
+        return jsonify({
+            'error': f"Política inválida. Use uma de: {', '.join(lb_policies.POLICIES)}"
+        }), 400
+    old_policy, LB_POLICY = LB_POLICY, policy
+    rebuild_selector()
+    log.info('policy', old=old_policy, new=policy)
+    return jsonify({'old_policy': old_policy, 'new_policy': policy})
+
 @app.route('/start_server')
 def start_server_route():
     server_id = request.args.get('server')
     ok, msg = start_server(server_id)
     code = 200 if ok else 400
-    print(f"[SERVER] {msg}")
+    log.info('server', message=msg)
     return jsonify({'message': msg}), code
 
 @app.route('/stop_server')
@@ -136,7 +1038,7 @@ def stop_server_route():
     server_id = request.args.get('server')
     ok, msg = stop_server(server_id)
     code = 200 if ok else 400
-    print(f"[SERVER] {msg}")
+    log.info('server', message=msg)
     return jsonify({'message': msg}), code
 
 @app.route('/toggle_server')
@@ -144,25 +1046,40 @@ def toggle_server():
     server_id = request.args.get('server')
     for s in SERVERS:
         if s['id'].lower() == server_id.lower():
-            s['healthy'] = not s['healthy']
+            if not s['healthy']:
+                breakers[s['id']].reset()  # religar manualmente fecha o breaker
+            set_healthy(s, not s['healthy'])
             new_status = "ON" if s['healthy'] else "OFF"
-            print(f"[TOGGLE] {s['id']} agora está {new_status}")
+            log.info('toggle', server=s['id'], status=new_status)
             return jsonify({'message': f"{s['id']} atualizado.", 'new_status': new_status})
     return jsonify({'error': 'Servidor não encontrado'}), 404
 
 @app.route('/')
 def dashboard():
-    with stats_lock:
-        healthy = {s['id']: 'ON' if s['healthy'] else 'OFF' for s in SERVERS}
-        weights = {s['id']: s['weight'] for s in SERVERS}
-        return render_template_string('''
+    with retry_lock:
+        retries = dict(retry_stats)
+    return render_template_string('''
         <meta http-equiv="refresh" content="3">
         <h1>RandDistri - Dashboard</h1>
-        <h3>Servidores:</h3>
+        <h3>Servidores (política: {{ policy }}):</h3>
         <pre>
-Server1: {{ healthy.Server1 }} ({{ stats.Server1 }} reqs) | Peso: {{ weights.Server1 }}
-Server2: {{ healthy.Server2 }} ({{ stats.Server2 }} reqs) | Peso: {{ weights.Server2 }}
-Server3: {{ healthy.Server3 }} ({{ stats.Server3 }} reqs) | Peso: {{ weights.Server3 }}
+{% for s in servers -%}
+{{ s.id }}: {{ 'ON' if s.healthy else 'OFF' }} ({{ stats[s.id] }} reqs) | Peso: {{ s.weight }} (efetivo {{ s.effective_weight or s.weight }}{{ ', slow-start' if s.recovered_at }}) | p95: {{ s.load.p95_ms if s.load else '-' }} ms | Em andamento: {{ s.inflight or 0 }} | EWMA: {{ '%.1f' % (s.ewma_ms or 0) }} ms | Breaker: {{ breakers[s.id].state }}
+{% endfor -%}
+Ajuste automático de pesos: {{ 'ligado' if autotune.enabled else 'desligado' }} | travados: {{ autotune.locked|sort|join(', ') or '-' }}
+{% for e in autotune_log -%}
+  {{ e.server }}: {{ e.old }} → {{ e.new }} ({{ e.reason }})
+{% endfor -%}
+Health check: intervalos {{ health.intervals_s }} | detecção de queda média {{ health.detection.avg_s }}s (máx {{ health.detection.max_s }}s)
+Cache: {{ 'ligado' if cache.enabled else 'desligado' }} | acertos {{ '%.1f' % (cache.hit_rate * 100) }}% | {{ cache.buffered }} números em {{ cache.ranges }} intervalos | refill médio {{ cache.avg_refill_ms }} ms
+Admissão: fila {{ admission.queue_length }}/{{ admission.max_queue }} | limite {{ admission.max_inflight }} por servidor | em andamento {{ admission.inflight }} | {{ admission.queued }} esperaram | {{ admission.shed }} recusadas (503)
+{% for c, lat in latency_by_class.items() -%}
+  {{ c }} (peso {{ admission.shares[c] }}): p50 {{ lat.p50_ms }} ms | p95 {{ lat.p95_ms }} ms | p99 {{ lat.p99_ms }} ms | {{ admission.classes[c].queued }} esperaram (média {{ admission.classes[c].avg_queue_ms }} ms)
+{% endfor -%}
+Limite de taxa: {{ 'ligado' if rate_limit_on else 'desligado' }} | {% for kind, rl in rate_limit.items() %}{{ kind }}: {{ rl.rejected }} recusadas (429), {{ rl.clients }} clientes{{ ' | ' if not loop.last }}{% endfor %}
+Hedging: {{ 'ligado' if hedging.enabled else 'por requisição' }} | limiar {{ hedging.threshold_ms }} ms | {{ '%.1f' % (hedging.hedge_rate * 100) }}% duplicadas | {{ hedging.wins }} vitórias da cópia
+Coalescência: janela {{ coalescing.window_ms }} ms | {{ coalescing.coalescing_ratio }} pedidos por chamada | espera média {{ coalescing.avg_queue_ms }} ms
+Failover: {{ retries.retries }} retentativas | {{ retries.failovers }} recuperadas (máx {{ '%.0f' % retries.failover_ms_max }} ms) | {{ retries.exhausted }} esgotadas
         </pre>
         <hr>
         <h4>Alterar peso manualmente:</h4>
@@ -176,7 +1093,21 @@ Server3: {{ healthy.Server3 }} ({{ stats.Server3 }} reqs) | Peso: {{ weights.Ser
           Novo peso: <input type="number" name="weight" min="1" required>
           <button type="submit">Atualizar</button>
         </form>
-        ''', stats=stats, healthy=healthy, weights=weights)
+        <h4>Política de balanceamento:</h4>
+        <form method="get" action="/set_policy">
+          <select name="policy">
+            {% for p in policies %}<option {{ 'selected' if p == policy }}>{{ p }}</option>{% endfor %}
+          </select>
+          <button type="submit">Trocar</button>
+        </form>
+        ''', stats=served_counts(), servers=SERVERS, breakers=breakers, health=health.stats(),
+        autotune=autotune, autotune_log=list(autotune_log)[-10:],
+        retries=retries, hedging=hedging_stats(), admission=admission.stats(),
+        latency_by_class=class_latency_stats(),
+        rate_limit={kind: limiter.stats() for kind, limiter in rate_limits.items()},
+        rate_limit_on=LB_RATE_LIMIT, coalescing=coalescer.stats(),
+        cache={'enabled': LB_CACHE, **cache.stats()},
+        policy=LB_POLICY, policies=lb_policies.POLICIES)
 
 if __name__ == '__main__':
     print("Load Balancer → http://localhost:8080")
@@ -0,0 +1,360 @@
+import asyncio
+import os
+import random
+import subprocess
+import time
+
+import aiohttp
+from aiohttp import web
+
+import lb_policies
+
+# Versão assíncrona do Load Balancer: um único event loop atende as
+# requisições simultâneas, sem uma thread presa a cada chamada ao backend
+# (bench_lb.py mede quantas conexões cada versão aguenta).
+# Mesmas rotas do load_balancer.py (selecione com LB_MODE=async no start_all.py).
+
+SERVERS = [
+    {'id': 'Server1', 'url': 'http://127.0.0.1:5001', 'weight': 60, 'healthy': True},
+    {'id': 'Server2', 'url': 'http://127.0.0.1:5002', 'weight': 30, 'healthy': True},
+    {'id': 'Server3', 'url': 'http://127.0.0.1:5003', 'weight': 10, 'healthy': True}
+]
+
+LB_POLICY = os.getenv('LB_POLICY', 'alias')
+LB_MAX_RETRIES = int(os.getenv('LB_MAX_RETRIES', 2))
+LB_DEADLINE_S = float(os.getenv('LB_DEADLINE_S', 3))
+LB_POOL_SIZE = int(os.getenv('LB_POOL_SIZE', 32))
+LB_POOL_IDLE_TIMEOUT = float(os.getenv('LB_POOL_IDLE_TIMEOUT', 60))
+LB_PASSTHROUGH = os.getenv('LB_PASSTHROUGH', '0') == '1'
+# Health check adaptativo, com a mesma política do HealthScheduler
+LB_HEALTH_MIN_S = float(os.getenv('LB_HEALTH_MIN_S', 1))
+LB_HEALTH_MAX_S = float(os.getenv('LB_HEALTH_MAX_S', 10))
+HEALTH_STABLE_AFTER = 3
+HEALTH_JITTER = 0.2
+PORT = int(os.getenv('LB_PORT', 8080))
+
+processes = {}
+stats = {s['id']: 0 for s in SERVERS}
+retry_stats = {'retries': 0, 'failovers': 0, 'exhausted': 0}
+selector = None
+
+
+# --- Seleção de servidores --- #
+# Tudo roda no event loop, então não há necessidade de locks.
+def rebuild_selector():
+    global selector
+    healthy = [s for s in SERVERS if s['healthy']]
+    selector = lb_policies.build_selector(LB_POLICY, healthy, [s['weight'] for s in healthy])
+
+
+def set_healthy(server, healthy):
+    if server['healthy'] != healthy:
+        server['healthy'] = healthy
+        rebuild_selector()
+
+
+def find_server(server_id):
+    return next((s for s in SERVERS if s['id'].lower() == (server_id or '').lower()), None)
+
+
+def choose_server(exclude=()):
+    if selector is None:
+        return None
+    for _ in range(4):
+        server = selector.pick()
+        if server['id'] not in exclude:
+            return server
+    rest = [s for s in SERVERS if s['healthy'] and s['id'] not in exclude]
+    return random.choice(rest) if rest else None
+
+
+async def call_backend(session, server, path, params, headers, timeout):
+    lb_policies.record_start(server)
+    start = time.perf_counter()
+    latency_ms = None
+    try:
+        resp = await session.get(server['url'] + path, params=params, headers=headers, timeout=timeout)
+        latency_ms = (time.perf_counter() - start) * 1000
+        return resp
+    finally:
+        lb_policies.record_end(server, latency_ms)
+
+
+async def forward(session, path, params, headers, stream=False):
+    """Failover para outro servidor saudável, como no load_balancer.py."""
+    deadline = time.monotonic() + LB_DEADLINE_S
+    failed = []
+    while len(failed) <= LB_MAX_RETRIES:
+        remaining = deadline - time.monotonic()
+        chosen = choose_server(exclude={s['id'] for s in failed})
+        if chosen is None or remaining <= 0:
+            break
+        try:
+            # Fluxos não têm prazo total, só de conexão
+            timeout = (aiohttp.ClientTimeout(total=None, sock_connect=remaining) if stream
+                       else aiohttp.ClientTimeout(total=remaining))
+            resp = await call_backend(session, chosen, path, params, headers, timeout)
+            if resp.status >= 500:
+                resp.release()
+                raise aiohttp.ClientResponseError(resp.request_info, (), status=resp.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[FALHA] {chosen['id']}: {e!r}")
+            set_healthy(chosen, False)
+            failed.append(chosen)
+            continue
+        if failed:
+            retry_stats['retries'] += len(failed)
+            retry_stats['failovers'] += 1
+        return chosen, resp
+
+    retry_stats['retries'] += max(len(failed) - 1, 0)
+    retry_stats['exhausted'] += 1
+    return None, failed
+
+
+def passthrough_headers(resp, server, latency_ms):
+    headers = {k: v for k, v in resp.headers.items() if k.startswith('X-')}
+    headers['X-Request-To'] = server['url']
+    headers['X-Backend-Id'] = server['id']
+    headers['X-Upstream-Latency-Ms'] = f"{latency_ms:.1f}"
+    return headers
+
+
+def wants_passthrough(request, params):
+    flag = params.pop('passthrough', None)
+    if flag is not None:
+        return flag == '1'
+    return LB_PASSTHROUGH or request.headers.get('X-LB-Passthrough') == '1'
+
+
+def failure_response(failed):
+    if not failed:
+        return web.json_response({'error': 'No servers'}, status=503)
+    ids = ', '.join(s['id'] for s in failed)
+    return web.json_response({'error': f"{ids} está offline"}, status=500)
+
+
+# --- Rotas --- #
+async def generate(request):
+    session = request.app['session']
+    headers = {'Accept': request.headers.get('Accept', 'application/json')}
+    params = dict(request.query)
+    passthrough = wants_passthrough(request, params)
+    start = time.perf_counter()
+    chosen, resp = await forward(session, '/generate', params, headers)
+    if chosen is None:
+        return failure_response(resp)
+
+    stats[chosen['id']] += 1
+    # Pass-through (e formatos binários): corpo repassado em blocos, sem
+    # juntar o lote inteiro na memória; roteamento nos cabeçalhos
+    if passthrough or resp.content_type != 'application/json':
+        headers = passthrough_headers(resp, chosen, (time.perf_counter() - start) * 1000)
+        return await relay(request, resp, headers)
+    async with resp:
+        data = await resp.json()
+
+    data['request_to'] = chosen['url']
+    return web.json_response(data, status=resp.status)
+
+
+async def relay(request, resp, headers):
+    """Repassa o corpo de `resp` em blocos de 64 KB e libera a conexão."""
+    out = web.StreamResponse(status=resp.status, headers=headers)
+    out.content_type = resp.content_type
+    if resp.content_length is not None:
+        out.content_length = resp.content_length
+    await out.prepare(request)
+    try:
+        # write() aguarda o cliente consumir: backpressure ponta a ponta
+        async for block in resp.content.iter_chunked(64 * 1024):
+            await out.write(block)
+    except ConnectionResetError:
+        pass  # cliente desconectou
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Backend caiu ou o prazo (ClientTimeout) acabou no meio do corpo: os
+        # cabeçalhos já foram, então só resta fechar a conexão para o cliente
+        # ver a resposta incompleta em vez de um corpo truncado "válido"
+        print(f"[FALHA] corpo interrompido de {headers.get('X-Request-To')}: {e!r}")
+        if request.transport is not None:
+            request.transport.close()
+    finally:
+        resp.release()
+    return out
+
+
+async def stream(request):
+    session = request.app['session']
+    headers = {'Accept': request.headers.get('Accept', 'text/plain')}
+    chosen, resp = await forward(session, '/stream', dict(request.query), headers, stream=True)
+    if chosen is None:
+        return failure_response(resp)
+
+    stats[chosen['id']] += 1
+    return await relay(request, resp, {'X-Request-To': chosen['url']})
+
+
+async def set_weight(request):
+    server = find_server(request.query.get('server'))
+    try:
+        new_weight = int(request.query.get('weight', ''))
+    except ValueError:
+        new_weight = None
+    if new_weight is None or not request.query.get('server'):
+        return web.json_response({
+            'error': 'Parâmetros inválidos. Use /set_weight?server=Server1&weight=80'
+        }, status=400)
+    if not server:
+        return web.json_response({'error': 'Servidor não encontrado.'}, status=404)
+
+    old_weight, server['weight'] = server['weight'], new_weight
+    rebuild_selector()
+    print(f"[UPDATE] Peso de {server['id']} alterado: {old_weight} → {new_weight}")
+    return web.json_response({
+        'message': f"Peso de {server['id']} atualizado com sucesso.",
+        'old_weight': old_weight,
+        'new_weight': new_weight
+    })
+
+
+async def set_policy(request):
+    global LB_POLICY
+    policy = request.query.get('policy', '')
+    if policy not in lb_policies.POLICIES:
+        return web.json_response({
+            'error': f"Política inválida. Use uma de: {', '.join(lb_policies.POLICIES)}"
+        }, status=400)
+    old_policy, LB_POLICY = LB_POLICY, policy
+    rebuild_selector()
+    return web.json_response({'old_policy': old_policy, 'new_policy': policy})
+
+
+async def toggle_server(request):
+    server = find_server(request.query.get('server'))
+    if not server:
+        return web.json_response({'error': 'Servidor não encontrado'}, status=404)
+    set_healthy(server, not server['healthy'])
+    new_status = "ON" if server['healthy'] else "OFF"
+    print(f"[TOGGLE] {server['id']} agora está {new_status}")
+    return web.json_response({'message': f"{server['id']} atualizado.", 'new_status': new_status})
+
+
+def _start_process(server):
+    port = server['url'].split(":")[-1]
+    env = os.environ.copy()
+    env["SERVER_ID"] = server['id']
+    env["SERVER_PORT"] = port
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    return subprocess.Popen(["python", script_path], env=env)
+
+
+def _stop_process(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=3)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def start_server_route(request):
+    server = find_server(request.query.get('server'))
+    if not server:
+        return web.json_response({'message': "Servidor não encontrado."}, status=400)
+    if server['id'] in processes:
+        return web.json_response({'message': "Servidor já está rodando."}, status=400)
+    loop = asyncio.get_running_loop()
+    processes[server['id']] = await loop.run_in_executor(None, _start_process, server)
+    set_healthy(server, True)
+    msg = f"{server['id']} iniciado na porta {server['url'].split(':')[-1]}."
+    print(f"[SERVER] {msg}")
+    return web.json_response({'message': msg})
+
+
+async def stop_server_route(request):
+    server = find_server(request.query.get('server'))
+    if not server or server['id'] not in processes:
+        return web.json_response({'message': "Servidor não está rodando."}, status=400)
+    proc = processes.pop(server['id'])
+    await asyncio.get_running_loop().run_in_executor(None, _stop_process, proc)
+    set_healthy(server, False)
+    msg = f"{server['id']} foi encerrado."
+    print(f"[SERVER] {msg}")
+    return web.json_response({'message': msg})
+
+
+async def stats_route(request):
+    return web.json_response({
+        'requests': stats,
+        'retries': retry_stats,
+        'servers': [
+            {'id': s['id'], 'healthy': s['healthy'], 'weight': s['weight'],
+             'inflight': s.get('inflight', 0), 'ewma_ms': round(s.get('ewma_ms') or 0, 1),
+             'health_interval_s': s.get('health_interval', LB_HEALTH_MIN_S)}
+            for s in SERVERS
+        ],
+        'policy': LB_POLICY,
+    })
+
+
+# --- Health check --- #
+async def health_check(session, server):
+    try:
+        async with session.get(f"{server['url']}/health", timeout=aiohttp.ClientTimeout(total=1)) as resp:
+            ok = resp.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        ok = False
+    set_healthy(server, ok)
+    return ok
+
+
+async def health_loop(app, server):
+    # Uma tarefa por servidor (nunca dois checks ao mesmo tempo): fora do ar
+    # ou recém-mudado, a cada LB_HEALTH_MIN_S; depois de HEALTH_STABLE_AFTER
+    # resultados iguais o intervalo dobra até LB_HEALTH_MAX_S. Com jitter.
+    interval, streak, last = LB_HEALTH_MIN_S, 0, None
+    while True:
+        await asyncio.sleep(interval * random.uniform(1 - HEALTH_JITTER, 1 + HEALTH_JITTER))
+        ok = await health_check(app['session'], server)
+        streak = streak + 1 if ok == last else 1
+        last = ok
+        if not ok or streak < HEALTH_STABLE_AFTER:
+            interval = LB_HEALTH_MIN_S
+        else:
+            interval = min(interval * 2, LB_HEALTH_MAX_S)
+        server['health_interval'] = interval
+
+
+async def on_startup(app):
+    # Conexões keep-alive compartilhadas, limitadas por backend
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=LB_POOL_SIZE,
+                                     keepalive_timeout=LB_POOL_IDLE_TIMEOUT)
+    app['session'] = aiohttp.ClientSession(connector=connector)
+    app['health_tasks'] = [asyncio.create_task(health_loop(app, s)) for s in SERVERS]
+
+
+async def on_cleanup(app):
+    for task in app['health_tasks']:
+        task.cancel()
+    await app['session'].close()
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get('/generate', generate)
+    app.router.add_get('/stream', stream)
+    app.router.add_get('/set_weight', set_weight)
+    app.router.add_get('/set_policy', set_policy)
+    app.router.add_get('/toggle_server', toggle_server)
+    app.router.add_get('/start_server', start_server_route)
+    app.router.add_get('/stop_server', stop_server_route)
+    app.router.add_get('/stats', stats_route)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+rebuild_selector()
+
+if __name__ == '__main__':
+    print(f"Load Balancer (async) → http://localhost:{PORT}")
+    web.run_app(create_app(), host='0.0.0.0', port=PORT, backlog=4096, print=None)
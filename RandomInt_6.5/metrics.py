@@ -0,0 +1,252 @@
+import bisect
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Métricas no formato texto do Prometheus, sem dependências externas.
+#
+# Contadores, gauges e histogramas guardam os valores em SHARDS fatias, cada
+# uma com o seu lock; cada thread usa sempre a mesma fatia, então no caminho
+# quente quase nunca há disputa. As fatias só são somadas na leitura (/metrics).
+
+SHARDS = int(os.getenv('METRICS_SHARDS', 64))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Buckets de latência em segundos: potências de 2 de 0,25 ms a ~16 s
+LATENCY_BUCKETS = tuple(0.00025 * 2 ** i for i in range(17))
+
+_local = threading.local()
+_next_shard = itertools.count()
+
+
+def shard_index():
+    """Fatia desta thread (distribuídas em rodízio na primeira chamada)."""
+    try:
+        return _local.shard
+    except AttributeError:
+        _local.shard = next(_next_shard) % SHARDS
+        return _local.shard
+
+
+def _my_shard(shards):
+    # Caminho quente: lê a fatia direto do threading.local, sem chamada extra
+    try:
+        return shards[_local.shard]
+    except AttributeError:
+        return shards[shard_index()]
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Sharded:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.shards = [({}, threading.Lock()) for _ in range(SHARDS)]
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _add(self, key, n):
+        values, lock = _my_shard(self.shards)
+        with lock:
+            values[key] = values.get(key, 0) + n
+
+    def collect(self):
+        """{valores dos labels: soma de todas as fatias}."""
+        total = {}
+        for values, lock in self.shards:
+            with lock:
+                items = list(values.items())
+            for key, n in items:
+                total[key] = total.get(key, 0) + n
+        return total
+
+    def value(self, *label_values):
+        return self.collect().get(label_values, 0)
+
+    def clear(self):
+        for values, lock in self.shards:
+            with lock:
+                values.clear()
+
+    def samples(self):
+        for key, n in sorted(self.collect().items()):
+            yield self.name, _format_labels(self.labels, key), n
+
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def inc(self, *label_values, n=1):
+        values, lock = _my_shard(self.shards)
+        with lock:
+            values[label_values] = values.get(label_values, 0) + n
+
+
+class Gauge(_Sharded):
+    """Gauge somado entre as fatias (inc/dec de cada thread)."""
+    kind = 'gauge'
+
+    def inc(self, *label_values, n=1):
+        self._add(label_values, n)
+
+    def dec(self, *label_values, n=1):
+        self._add(label_values, -n)
+
+
+class Histogram(_Sharded):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        values, lock = _my_shard(self.shards)
+        with lock:
+            entry = values.get(label_values)
+            if entry is None:
+                entry = values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def collect(self):
+        total = {}
+        for values, lock in self.shards:
+            with lock:
+                items = [(key, (list(counts), s)) for key, (counts, s) in values.items()]
+            for key, (counts, s) in items:
+                acc = total.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                acc[0] = [a + b for a, b in zip(acc[0], counts)]
+                acc[1] += s
+        return total
+
+    def samples(self):
+        for key, (counts, s) in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                yield (self.name + '_bucket',
+                       _format_labels(self.labels, key, [('le', _format_value(float(bound)))]), cumulative)
+            yield self.name + '_sum', _format_labels(self.labels, key), s
+            yield self.name + '_count', _format_labels(self.labels, key), cumulative
+
+
+class Callback:
+    """Métrica lida na hora de uma função: `fn()` devolve um número ou um
+    dict {tupla de valores dos labels: número}. Serve para estado que já é
+    mantido em outro lugar (fila, pool, breakers...)."""
+
+    def __init__(self, name, help, kind='gauge', labels=(), fn=None, registry=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.fn = fn
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def samples(self):
+        result = self.fn()
+        if result is None:
+            return
+        if not isinstance(result, dict):
+            result = {(): result}
+        for key, n in sorted(result.items()):
+            yield self.name, _format_labels(self.labels, key), n
+
+
+class ShardedLog:
+    """Log curto (últimas `maxlen` entradas por fatia) sem lock global:
+    cada thread anexa na sua fatia com um número de sequência e `recent`
+    intercala as fatias pela sequência só na leitura."""
+
+    def __init__(self, maxlen=1000):
+        self.shards = [(deque(maxlen=maxlen), threading.Lock()) for _ in range(SHARDS)]
+        self.seq = itertools.count(1)  # next() é atômico no CPython
+        self.base = 0
+
+    def append(self, text):
+        entries, lock = _my_shard(self.shards)
+        with lock:
+            entries.append((next(self.seq), text))
+
+    def recent(self, n):
+        """Últimas `n` entradas como (número desde o último clear, texto)."""
+        merged = []
+        for entries, lock in self.shards:
+            with lock:
+                merged.extend(entries)
+        merged.sort()
+        return [(seq - self.base, text) for seq, text in merged[-n:] if seq > self.base]
+
+    def clear(self):
+        for entries, lock in self.shards:
+            with lock:
+                entries.clear()
+        self.base = next(self.seq)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """Texto de todas as métricas no formato de exposição do Prometheus."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+# --- Métricas do processo --- #
+_START_TIME = time.time()
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def register_process_metrics(registry=None):
+    Callback('process_cpu_seconds_total', 'Tempo de CPU (usuário + sistema) do processo.',
+             'counter', fn=lambda: sum(os.times()[:2]), registry=registry)
+    Callback('process_resident_memory_bytes', 'Memória residente do processo.',
+             fn=_rss_bytes, registry=registry)
+    Callback('process_start_time_seconds', 'Início do processo (epoch em segundos).',
+             fn=lambda: _START_TIME, registry=registry)
+    Callback('process_threads', 'Threads Python vivas.',
+             fn=threading.active_count, registry=registry)
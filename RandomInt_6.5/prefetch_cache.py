@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class PrefetchCache:
+    """Números pré-buscados em lote, um buffer por intervalo (min, max).
+
+    `get` só retira o próximo número do buffer; quando ele fica abaixo de
+    `low_water` um refill assíncrono chama `fetch(key, batch)` — que deve
+    devolver (servidor, lista de números). Intervalos frios saem por LRU
+    quando o total passa de `max_numbers` ou há mais de `max_ranges`.
+
+    Um intervalo só ganha buffer depois de `admit_after` misses: intervalos
+    pedidos uma vez só não disparam um lote nem empurram os quentes do LRU.
+    """
+
+    def __init__(self, fetch, executor, batch=1024, low_water=256,
+                 max_numbers=1_000_000, max_ranges=64, admit_after=2):
+        self.fetch = fetch
+        self.executor = executor
+        self.batch = batch
+        self.low_water = low_water
+        self.max_numbers = max_numbers
+        self.max_ranges = max_ranges
+        self.admit_after = admit_after
+        self.lock = threading.Lock()
+        self.buffers = OrderedDict()  # (min, max) -> deque de (número, servidor)
+        self.candidates = OrderedDict()  # (min, max) sem buffer -> misses até agora
+        self.refilling = set()
+        self.total = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_errors = 0
+        self.refill_ms_total = 0.0
+        self.evictions = 0
+
+    def get(self, key):
+        """(número, servidor) do buffer, ou None se ainda não houver."""
+        with self.lock:
+            buf = self.buffers.get(key)
+            if buf is None:
+                seen = self.candidates.pop(key, 0) + 1
+                if seen < self.admit_after:
+                    self.candidates[key] = seen
+                    while len(self.candidates) > self.max_ranges * 4:
+                        self.candidates.popitem(last=False)
+                    self.misses += 1
+                    return None
+                buf = self.buffers[key] = deque()
+                self._evict()
+            self.buffers.move_to_end(key)
+            item = buf.popleft() if buf else None
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.total -= 1
+            refill = len(buf) < self.low_water and key not in self.refilling
+            if refill:
+                self.refilling.add(key)
+        if refill:
+            self.executor.submit(self._refill, key)
+        return item
+
+    def _refill(self, key):
+        start = time.perf_counter()
+        try:
+            server, numbers = self.fetch(key, self.batch)
+        except Exception:
+            server, numbers = None, None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            self.refilling.discard(key)
+            if numbers is None:
+                self.refill_errors += 1
+                return
+            self.refills += 1
+            self.refill_ms_total += elapsed_ms
+            buf = self.buffers.get(key)
+            if buf is None:  # intervalo despejado enquanto buscava
+                return
+            buf.extend((n, server) for n in numbers)
+            self.total += len(numbers)
+            self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        """Remove intervalos menos usados até caber nos limites (com o lock)."""
+        while self.buffers and (self.total > self.max_numbers or len(self.buffers) > self.max_ranges):
+            key = next(iter(self.buffers))
+            if key == keep:
+                if len(self.buffers) == 1:
+                    break
+                self.buffers.move_to_end(key)
+                continue
+            self.total -= len(self.buffers.pop(key))
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.buffers.clear()
+            self.candidates.clear()
+            self.total = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'ranges': len(self.buffers),
+                'candidate_ranges': len(self.candidates),
+                'buffered': self.total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+                'refills': self.refills,
+                'refill_errors': self.refill_errors,
+                'avg_refill_ms': round(self.refill_ms_total / self.refills, 1) if self.refills else 0,
+                'evictions': self.evictions,
+            }
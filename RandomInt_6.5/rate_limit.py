@@ -0,0 +1,72 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket por cliente.
+
+    Cada chave tem um balde de até `burst` tokens que enche a `rate` tokens
+    por segundo. O balde só é atualizado quando o cliente aparece (O(1) por
+    requisição); baldes que já estariam cheios equivalem a um cliente novo e
+    são removidos por `cleanup`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.buckets = {}  # chave -> [tokens, instante da última atualização]
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key, cost=1):
+        """Tenta gastar `cost` tokens de `key`.
+
+        Devolve (permitido, tokens restantes, segundos até o balde ter `cost`).
+        Um custo maior que o balde cheio é limitado a `burst`.
+        """
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            ok = tokens >= cost
+            if ok:
+                tokens -= cost
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self.buckets[key] = [tokens, now]
+        wait_s = 0.0 if ok else (cost - tokens) / self.rate
+        return ok, tokens, wait_s
+
+    def cleanup(self):
+        now = time.monotonic()
+        with self.lock:
+            idle = [key for key, (tokens, updated) in self.buckets.items()
+                    if tokens + (now - updated) * self.rate >= self.burst]
+            for key in idle:
+                del self.buckets[key]
+        return len(idle)
+
+    def start_janitor(self, interval=30.0):
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.cleanup()
+
+        threading.Thread(target=loop, daemon=True).start()
+        return self
+
+    def stats(self):
+        with self.lock:
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'clients': len(self.buckets),
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+            }
@@ -1,5 +1,19 @@
-from flask import Flask, jsonify, request
-import random, time, os
+from flask import Flask, Response, g, jsonify, request
+from array import array
+from collections import deque
+import random, time, os, sys, math, itertools, threading
+from entropy_pool import EntropyPool
+import metrics
+
+try:
+    import numpy as np  # opcional: acelera a geração de lotes grandes
+except ImportError:
+    np = None
+
+try:
+    import psutil  # opcional: memória do processo fora do Linux
+except ImportError:
+    psutil = None
 
 app = Flask(__name__)
 SERVER_ID = os.getenv('SERVER_ID', 'Server1')
@@ -8,31 +22,383 @@ PORT = int(os.getenv('SERVER_PORT', 5001))
 # Intervalos padrão de cada servidor (caso o cliente não envie)
 RANGES = {'Server1': (1, 50), 'Server2': (40, 80), 'Server3': (70, 100)}
 
-@app.route('/generate')
-def generate():
-    time.sleep(0.05)
+# Tamanho máximo de um lote em /generate?count=N
+MAX_BATCH = int(os.getenv('MAX_BATCH', 10**6))
+# Quantidade de números por bloco enviado em /stream
+STREAM_CHUNK = int(os.getenv('STREAM_CHUNK', 4096))
+
+# Pool de palavras aleatórias pré-geradas (reabastecido em segundo plano)
+POOL = EntropyPool(
+    size=int(os.getenv('POOL_SIZE', 1 << 20)),
+    low_water=float(os.getenv('POOL_LOW_WATER', 0.5)),
+).start()
+
+# --- MODELO DE LATÊNCIA --- #
+# Formato: "none", "fixed:50", "normal:50,10", "lognormal:50,0.5" ou "replay:arquivo.txt"
+# (valores em ms; no lognormal o primeiro é a mediana e o segundo o sigma)
+REPLAY_MAX_BYTES = 1 << 20  # arquivo de replay: no máximo 1 MB
+LATENCY_MAX_MS = 60_000  # nenhuma amostra dorme mais que isso (caudas do normal/lognormal)
+
+def _numbers(text, count=None):
+    """Valores finitos separados por vírgula (`count` deles, se informado)."""
+    values = [float(x) for x in text.split(',')] if text else []
+    if count is not None and len(values) != count:
+        raise ValueError(f'Esperados {count} valores, recebidos {len(values)}')
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError('Os valores devem ser finitos')
+    return values
+
+def parse_latency_model(spec, allow_replay=True):
+    """Converte a especificação em um dict com o nome e a função de amostragem (ms).
+
+    `replay:` lê um arquivo local, então só é aceito de quem inicia o servidor
+    (LATENCY_MODEL); a rota /latency chama com allow_replay=False.
+    """
+    name, _, args = spec.strip().partition(':')
+    name = name.lower() or 'none'
+    if name == 'none':
+        sampler = lambda: 0.0
+    elif name == 'fixed':
+        ms, = _numbers(args or '50', 1)
+        if ms < 0:
+            raise ValueError('fixed: a latência não pode ser negativa')
+        sampler = lambda: ms
+    elif name == 'normal':
+        mean, std = _numbers(args or '50,10', 2)
+        if mean < 0 or std < 0:
+            raise ValueError('normal: média e desvio não podem ser negativos')
+        sampler = lambda: max(0.0, random.gauss(mean, std))
+    elif name == 'lognormal':
+        median, sigma = _numbers(args or '50,0.5', 2)
+        if median <= 0 or sigma < 0:
+            raise ValueError('lognormal: a mediana deve ser positiva e o sigma não negativo')
+        mu = math.log(median)  # calculado uma vez: erro aqui vira 400, não 500 a cada amostra
+        sampler = lambda: random.lognormvariate(mu, sigma)
+    elif name == 'replay' and allow_replay:
+        # Um valor em ms por linha, repetidos em ciclo
+        with open(args, encoding='utf-8') as f:
+            text = f.read(REPLAY_MAX_BYTES + 1)
+        if len(text) > REPLAY_MAX_BYTES:
+            raise ValueError(f'Arquivo de latências maior que {REPLAY_MAX_BYTES} bytes: {args}')
+        samples = _numbers(','.join(line for line in text.splitlines() if line.strip()))
+        if not samples:
+            raise ValueError(f'Arquivo de latências vazio: {args}')
+        if min(samples) < 0:
+            raise ValueError(f'Arquivo de latências com valor negativo: {args}')
+        cycle = itertools.cycle(samples)
+        sampler = lambda: next(cycle)
+    else:
+        raise ValueError(f'Modelo de latência desconhecido: {name}')
+    return {'spec': spec, 'name': name, 'sample_ms': sampler}
+
+latency_model = parse_latency_model(os.getenv('LATENCY_MODEL', 'fixed:50'))
+
+def simulate_latency():
+    delay = min(latency_model['sample_ms'](), LATENCY_MAX_MS)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+def elapsed_ms(start):
+    """Tempo de serviço real desde `start` (perf_counter), em ms."""
+    return round((time.perf_counter() - start) * 1000, 3)
+
+# --- Carga do servidor (relatada em /health) --- #
+load_lock = threading.Lock()
+inflight = 0
+service_times = deque(maxlen=1024)  # últimos tempos de serviço de /generate (ms)
+# CPU medida por uma thread só, em janelas fixas: se cada /health medisse
+# "desde a última consulta", o LB e o dashboard (que consultam os dois)
+# receberiam cada um o intervalo deixado pelo outro
+CPU_SAMPLE_S = float(os.getenv('CPU_SAMPLE_S', 1.0))
+cpu_last = 0.0
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 2)
+
+def cpu_sampler():
+    global cpu_last
+    last_t, last_cpu = time.monotonic(), sum(os.times()[:2])
+    while True:
+        time.sleep(CPU_SAMPLE_S)
+        now, cpu = time.monotonic(), sum(os.times()[:2])
+        cpu_last = round((cpu - last_cpu) / (now - last_t), 3) if now > last_t else 0.0
+        last_t, last_cpu = now, cpu
+
+threading.Thread(target=cpu_sampler, daemon=True).start()
+
+def cpu_usage():
+    """Fração de CPU usada pelo processo na última janela de CPU_SAMPLE_S."""
+    return cpu_last
+
+def rss_mb():
+    if psutil is not None:
+        return round(psutil.Process().memory_info().rss / 2**20, 1)
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+@app.before_request
+def track_start():
+    global inflight
+    if request.endpoint in ('generate', 'stream'):
+        g.start = time.perf_counter()
+        with load_lock:
+            inflight += 1
+
+# --- Métricas (/metrics) --- #
+REQUESTS = metrics.Counter('randint_server_requests_total', 'Requisições atendidas por rota e status.',
+                           ['server', 'endpoint', 'status'])
+DURATION = metrics.Histogram('randint_server_request_duration_seconds',
+                             'Tempo de serviço até a resposta (streams: até os cabeçalhos).',
+                             ['server', 'endpoint'])
+metrics.Callback('randint_server_inflight', 'Requisições em andamento.',
+                 labels=['server'], fn=lambda: {(SERVER_ID,): inflight})
+metrics.Callback('randint_server_pool_fill_ratio', 'Fração do pool de entropia disponível.',
+                 labels=['server'], fn=lambda: {(SERVER_ID,): POOL.stats()['fill_level']})
+metrics.Callback('randint_server_pool_underflows_total', 'Vezes em que o pool de entropia esvaziou.',
+                 'counter', labels=['server'], fn=lambda: {(SERVER_ID,): POOL.stats()['underflows']})
+metrics.register_process_metrics()
+
+@app.after_request
+def count_request(resp):
+    start = g.get('start')
+    if start is not None:
+        REQUESTS.inc(SERVER_ID, request.endpoint, resp.status_code)
+        DURATION.observe(time.perf_counter() - start, SERVER_ID, request.endpoint)
+    return resp
+
+def request_done(endpoint, start):
+    global inflight
+    with load_lock:
+        inflight -= 1
+        if endpoint == 'generate':
+            service_times.append((time.perf_counter() - start) * 1000)
+
+@app.teardown_request
+def track_end(exc=None):
+    start = g.pop('start', None)
+    # Um /stream continua em andamento depois dos cabeçalhos: o teardown roda
+    # antes do corpo, então quem fecha a conta é o call_on_close da resposta
+    if start is not None and not g.pop('streaming', False):
+        request_done(request.endpoint, start)
+
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+_rng = np.random.default_rng() if np is not None else None
+
+# Formatos aceitos em /generate (negociados pelo cabeçalho Accept)
+OUTPUT_FORMATS = ['application/json', 'application/octet-stream', 'application/x-npy']
+STREAM_FORMATS = ['text/plain', 'application/octet-stream']
+DTYPES = {'int32': ('<i4', 'i', INT32_MIN, INT32_MAX), 'int64': ('<i8', 'q', INT64_MIN, INT64_MAX)}
+
+
+def generate_batch(min_val, max_val, count):
+    """Gera `count` inteiros em [min_val, max_val] numa única passada.
+
+    Intervalos de até 2**32 valores saem do pool pré-gerado (caminho rápido);
+    os demais caem no NumPy ou no `random`. Devolve um ndarray (NumPy) ou um array('q'); ambos expõem o buffer
+    binário sem criar um objeto Python por número ao serializar.
+    """
+    if INT64_MIN <= min_val and max_val <= INT64_MAX:
+        numbers = POOL.randints(min_val, max_val, count)
+        if numbers is not None:
+            return numbers
+    if _rng is not None and INT64_MIN <= min_val and max_val < INT64_MAX:
+        return _rng.integers(min_val, max_val, endpoint=True, size=count)
+    numbers = random.choices(range(min_val, max_val + 1), k=count)
+    if INT64_MIN <= min_val and max_val <= INT64_MAX:
+        return array('q', numbers)
+    return numbers
+
+
+def pick_dtype(min_val, max_val, requested=None):
+    """Escolhe int32/int64 para o intervalo; None se não couber."""
+    names = [requested] if requested else ['int32', 'int64']
+    for name in names:
+        if name in DTYPES and DTYPES[name][2] <= min_val and max_val <= DTYPES[name][3]:
+            return name
+    return None
 
-    # Lê parâmetros enviados pelo cliente (ou usa padrão)
+
+def pack_numbers(numbers, dtype):
+    """Empacota os números como inteiros little-endian do tipo `dtype`."""
+    descr, typecode = DTYPES[dtype][:2]
+    if np is not None and isinstance(numbers, np.ndarray):
+        return numbers.astype(descr, copy=False).tobytes()
+    if not (isinstance(numbers, array) and numbers.typecode == typecode):
+        numbers = array(typecode, numbers)
+    if sys.byteorder == 'big':
+        numbers = array(typecode, numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+def npy_header(dtype, count):
+    """Cabeçalho do formato .npy (versão 1.0) para um vetor 1-D."""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (DTYPES[dtype][0], count)
+    # magic(6) + versão(2) + tamanho(2) + cabeçalho + '\n' deve ser múltiplo de 64
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + ' ' * (padding % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+def read_range():
+    """Lê min/max enviados pelo cliente (ou usa o intervalo padrão do servidor)."""
     try:
         min_val = int(request.args.get('min', RANGES[SERVER_ID][0]))
         max_val = int(request.args.get('max', RANGES[SERVER_ID][1]))
     except ValueError:
         min_val, max_val = RANGES[SERVER_ID]
+    return min_val, max_val
+
+
+@app.route('/generate')
+def generate():
+    start = time.perf_counter()
+    simulate_latency()
 
+    min_val, max_val = read_range()
     if min_val >= max_val:
         return jsonify({'error': 'Intervalo inválido!'}), 400
 
-    num = random.randint(min_val, max_val)
-    return jsonify({
-        'number': num,
-        'from_server': SERVER_ID,
-        'timestamp': time.time(),
-        'latency_ms': 50
+    fmt = request.accept_mimetypes.best_match(OUTPUT_FORMATS) or 'application/json'
+
+    # Sem `count` (e em JSON) mantém a resposta antiga (um único número)
+    if 'count' not in request.args and fmt == 'application/json':
+        num = int(generate_batch(min_val, max_val, 1)[0])
+        return jsonify({
+            'number': num,
+            'from_server': SERVER_ID,
+            'timestamp': time.time(),
+            'latency_ms': elapsed_ms(start)
+        })
+
+    try:
+        count = int(request.args.get('count', 1))  # ?count=abc é erro, não 1 número
+    except ValueError:
+        count = 0
+    if not 1 <= count <= MAX_BATCH:
+        return jsonify({'error': f'count deve estar entre 1 e {MAX_BATCH}'}), 400
+
+    dtype = None
+    if fmt != 'application/json':
+        dtype = pick_dtype(min_val, max_val, request.args.get('dtype'))
+        if dtype is None:
+            return jsonify({'error': 'dtype inválido para o intervalo (use int32 ou int64)'}), 400
+
+    numbers = generate_batch(min_val, max_val, count)
+
+    if fmt == 'application/json':
+        return jsonify({
+            'numbers': numbers.tolist() if hasattr(numbers, 'tolist') else numbers,
+            'count': count,
+            'from_server': SERVER_ID,
+            'timestamp': time.time(),
+            'latency_ms': elapsed_ms(start)
+        })
+
+    # Binário: bytes little-endian direto do buffer gerado
+    body = pack_numbers(numbers, dtype)
+    if fmt == 'application/x-npy':
+        body = npy_header(dtype, count) + body
+    return Response(body, mimetype=fmt, headers={
+        'X-From-Server': SERVER_ID,
+        'X-Count': str(count),
+        'X-Dtype': dtype,
+        'X-Latency-Ms': str(elapsed_ms(start)),
     })
 
+@app.route('/stream')
+def stream():
+    """Envia números em blocos até o cliente desconectar ou atingir `limit`.
+
+    Cada bloco só é gerado depois que o anterior foi escrito no socket,
+    então um cliente lento segura o gerador (backpressure natural do WSGI).
+    """
+    min_val, max_val = read_range()
+    if min_val >= max_val:
+        return jsonify({'error': 'Intervalo inválido!'}), 400
+
+    limit = request.args.get('limit')  # sem limit → fluxo infinito
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0  # ?limit=abc não pode virar fluxo infinito
+        if limit < 1:
+            return jsonify({'error': 'limit deve ser um inteiro positivo'}), 400
+    chunk = min(max(request.args.get('chunk', STREAM_CHUNK, type=int), 1), MAX_BATCH)
+
+    fmt = request.accept_mimetypes.best_match(STREAM_FORMATS) or 'text/plain'
+    dtype = None
+    if fmt == 'application/octet-stream':
+        dtype = pick_dtype(min_val, max_val, request.args.get('dtype'))
+        if dtype is None:
+            return jsonify({'error': 'dtype inválido para o intervalo (use int32 ou int64)'}), 400
+
+    def blocks():
+        sent = 0
+        while limit is None or sent < limit:
+            n = chunk if limit is None else min(chunk, limit - sent)
+            numbers = generate_batch(min_val, max_val, n)
+            if dtype:
+                yield pack_numbers(numbers, dtype)
+            else:
+                yield '\n'.join(map(str, numbers)) + '\n'
+            sent += n
+
+    headers = {'X-From-Server': SERVER_ID}
+    if dtype:
+        headers['X-Dtype'] = dtype
+    resp = Response(blocks(), mimetype=fmt, headers=headers)
+    start = g.get('start')
+    if start is not None:
+        g.streaming = True
+        resp.call_on_close(lambda: request_done('stream', start))
+    return resp
+
+@app.route('/latency')
+def latency():
+    """Consulta ou troca o modelo de latência (ex.: /latency?model=normal:50,10)."""
+    global latency_model
+    spec = request.args.get('model')
+    if spec is None:
+        return jsonify({'model': latency_model['spec']})
+    try:
+        new_model = parse_latency_model(spec, allow_replay=False)
+    except (ValueError, OSError):
+        return jsonify({'error': 'Modelo inválido. Use none, fixed:50, normal:50,10 ou lognormal:50,0.5 '
+                                 '(replay só pela variável LATENCY_MODEL)'}), 400
+    old, latency_model = latency_model['spec'], new_model
+    print(f"[LATÊNCIA] {SERVER_ID}: {old} → {spec}")
+    return jsonify({'old_model': old, 'new_model': spec})
+
 @app.route('/health')
 def health():
-    return jsonify({'status': 'healthy'})
+    # Formato compacto: o LB consulta com frequência para ajustar os pesos
+    with load_lock:
+        times = sorted(service_times)
+        current = inflight
+    pool = POOL.stats()
+    return jsonify({
+        'status': 'healthy',
+        'inflight': current,
+        'p50_ms': percentile(times, 0.50),
+        'p95_ms': percentile(times, 0.95),
+        'p99_ms': percentile(times, 0.99),
+        'cpu': cpu_usage(),
+        'rss_mb': rss_mb(),
+        'pool': {'fill': pool['fill_level'], 'refill_wps': pool['refill_rate_wps'],
+                 'underflows': pool['underflows']},
+    })
+
+@app.route('/metrics')
+def metrics_route():
+    return Response(metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     print(f"Servidor {SERVER_ID} rodando na porta {PORT}")
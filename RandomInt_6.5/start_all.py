@@ -14,6 +14,10 @@ except AttributeError:
 
 IS_WINDOWS = platform.system() == "Windows"
 
+# Modo do Load Balancer: "sync" (Flask) ou "async" (aiohttp, muitas conexões simultâneas)
+LB_MODE = os.getenv("LB_MODE", "sync")
+LB_SCRIPTS = {"sync": "load_balancer.py", "async": "load_balancer_async.py"}
+
 processes = {
     "Server1": None,
     "Server2": None,
@@ -39,9 +43,9 @@ def run_server(server_id, port):
     )
 
 def run_lb():
-    print("[START] Load Balancer na porta 8080")
+    print(f"[START] Load Balancer ({LB_MODE}) na porta 8080")
     return subprocess.Popen(
-        ["python", "load_balancer.py"],
+        ["python", LB_SCRIPTS[LB_MODE]],
         cwd=os.getcwd(),
         stdout=subprocess.DEVNULL,
         stderr=subprocess.STDOUT
@@ -143,6 +147,14 @@ def simulate_failure(server_name="Server2", downtime=10):
 # Menus interativos
 # =========================
 
+def toggle_lb_mode():
+    """Alterna entre o LB síncrono e o assíncrono (vale no próximo início do LB)"""
+    global LB_MODE
+    LB_MODE = "async" if LB_MODE == "sync" else "sync"
+    print(f"\n⚖️  Modo do Load Balancer: {LB_MODE} ({LB_SCRIPTS[LB_MODE]})")
+    if processes["LoadBalancer"] and processes["LoadBalancer"].poll() is None:
+        print("   Reinicie o Load Balancer para aplicar.")
+
 def show_main_menu():
     print("""
 =============================
@@ -155,6 +167,7 @@ def show_main_menu():
 5️⃣  Ver status dos serviços
 6️⃣  Gerenciar servidores individualmente
 7️⃣  Simular falha temporária
+8️⃣  Alternar modo do Load Balancer (sync/async)
 0️⃣  Sair
 """)
 
@@ -223,6 +236,8 @@ if __name__ == "__main__":
                 simulate_failure(s, downtime)
             else:
                 print("❌ Não é possível simular falha no Load Balancer.")
+        elif choice == "8":
+            toggle_lb_mode()
         elif choice == "0":
             print("\nEncerrando o gerenciador...")
             stop_all()